@@ -12,10 +12,19 @@ if str(BACKEND_DIR) not in sys.path:
 
 # Importar repositorio del backend
 import repository.store_repo as store_repo
+from rest import cdn
+from rest.compression import init_compression
+from rest.json_provider import init_json
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'onsen-coffee-admin-key')
 CORS(app)
+init_compression(app)
+init_json(app)
+
+def page_args():
+    """Parámetros de paginación por cursor: ?limit=N&cursor=..."""
+    return request.args.get('limit', type=int), request.args.get('cursor')
 
 # ========== RUTA PRINCIPAL ==========
 @app.route('/admin')
@@ -29,8 +38,11 @@ def admin_dashboard():
 def get_orders():
     try:
         status_filter = request.args.get('status', 'all')
-        orders = store_repo.obtainOrders(status_filter)
+        limit, cursor = page_args()
+        orders = store_repo.obtainOrders(status_filter, limit=limit, cursor=cursor)
         return jsonify(orders)
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -52,13 +64,28 @@ def delete_order(order_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/admin/api/stats/revenue', methods=['GET'])
+def get_revenue():
+    try:
+        days = request.args.get('days', 30, type=int)
+        return jsonify(store_repo.getRevenueByDay(days))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/api/stats/reads', methods=['GET'])
+def get_read_stats():
+    return jsonify(store_repo.getReadStats())
+
 # ========== RUTAS DE USUARIOS ==========
 
 @app.route('/admin/api/users', methods=['GET'])
 def get_users():
     try:
-        users = store_repo.obtainUsers()
+        limit, cursor = page_args()
+        users = store_repo.obtainUsers(limit=limit, cursor=cursor)
         return jsonify(users)
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -94,8 +121,11 @@ def delete_user(user_id):
 @app.route('/admin/api/coffees', methods=['GET'])
 def get_coffees():
     try:
-        coffees = store_repo.obtainCoffees()
+        limit, cursor = page_args()
+        coffees = store_repo.obtainCoffees(limit=limit, cursor=cursor)
         return jsonify(coffees)
+    except ValueError as ve:
+        return jsonify({'error': str(ve)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -140,6 +170,7 @@ def save_new_coffee():
                 coffee_data['image_url'] = coffee_data['selected_image']
         
         store_repo.saveNewCoffee(coffee_data)
+        cdn.purge_product()
         return jsonify({"message": "Coffee registered successfully"})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -185,6 +216,7 @@ def update_coffee(coffee_id):
                 coffee_data['image_url'] = coffee_data['selected_image']
         
         store_repo.updateCoffee(coffee_data)
+        cdn.purge_product(coffee_id)
         return jsonify({"message": "Coffee updated successfully"})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -193,6 +225,7 @@ def update_coffee(coffee_id):
 def delete_coffee_route(coffee_id):
     try:
         store_repo.deleteCoffee(coffee_id)
+        cdn.purge_product(coffee_id)
         return jsonify({"message": "Coffee deleted successfully"})
     except Exception as e:
         return f"Error: {str(e)}", 500
@@ -201,6 +234,7 @@ def delete_coffee_route(coffee_id):
 def delete_coffee_api(coffee_id):
     try:
         store_repo.deleteCoffee(coffee_id)
+        cdn.purge_product(coffee_id)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,5 +1,6 @@
 from flask import jsonify, render_template, request, session, url_for
 import repository.store_repo as store_repo
+from rest import cdn
 import os
 from werkzeug.utils import secure_filename
 
@@ -31,6 +32,10 @@ def register_routes(app):
                 coffee['image_url'] = default_images[i % len(default_images)]
         return render_template('index-admin.html', coffees=coffees)
     
+    @app.route(admin_route + "metrics", methods=['GET'])
+    def readMetrics():
+        return jsonify(store_repo.getReadStats())
+    
     @app.route(admin_route + "register-coffee")
     def register_coffee():
         # Imágenes disponibles en assets
@@ -63,4 +68,5 @@ def register_routes(app):
                 coffee_data['image_url'] = coffee_data['selected_image']
         
         store_repo.saveNewCoffee(coffee_data)
+        cdn.purge_product()
         return jsonify({"message": "New coffee registered successfully"})
\ No newline at end of file
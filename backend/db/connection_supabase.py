@@ -3,8 +3,14 @@ Conexión a Supabase - Onsen Coffee
 Base de datos PostgreSQL serverless con toda la potencia de Supabase
 """
 
+import asyncio
 import os
-from supabase import create_client, Client
+import threading
+from functools import wraps
+
+import httpx
+from supabase import acreate_client, create_client, AsyncClient, Client
+from supabase.lib.client_options import AsyncClientOptions, SyncClientOptions
 
 # Cargar variables de entorno (solo en desarrollo local)
 try:
@@ -26,14 +32,87 @@ SUPABASE_SERVICE_KEY = (
     os.environ.get('SUPABASE_SERVICE_KEY', '')
 )
 
-# Cliente Supabase global
-_supabase_client: Client = None
+# Pool HTTP compartido por todos los clientes (keep-alive + HTTP/2)
+SUPABASE_HTTP2 = os.environ.get('SUPABASE_HTTP2', '1') != '0'
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get('SUPABASE_MAX_CONNECTIONS', '20'))
+SUPABASE_MAX_KEEPALIVE = int(os.environ.get('SUPABASE_MAX_KEEPALIVE', '10'))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.environ.get('SUPABASE_KEEPALIVE_EXPIRY', '60'))
+SUPABASE_CONNECT_TIMEOUT = float(os.environ.get('SUPABASE_CONNECT_TIMEOUT', '5'))
+SUPABASE_TIMEOUT = float(os.environ.get('SUPABASE_TIMEOUT', '15'))
+
+# Clientes Supabase por (url, rol de la key)
+_supabase_clients: dict = {}
+_http_client: httpx.Client = None
+_clients_lock = threading.Lock()
+
+# Event loop de larga duración donde vive el cliente asíncrono compartido
+_async_loop: asyncio.AbstractEventLoop = None
+_async_clients: dict = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _http_pool_options() -> dict:
+    """Opciones comunes de los pools httpx (síncrono y asíncrono)"""
+    return {
+        'http2': SUPABASE_HTTP2 and _http2_available(),
+        'limits': httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+        ),
+        'timeout': httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        'follow_redirects': True,
+    }
+
+
+def _resolve_key(use_service_key: bool) -> tuple:
+    """Devuelve (rol, key) según se pida la service key o la anon key"""
+    if not SUPABASE_URL:
+        raise Exception("SUPABASE_URL no está configurado")
+    
+    if use_service_key and SUPABASE_SERVICE_KEY:
+        role, key = 'service', SUPABASE_SERVICE_KEY
+    else:
+        role, key = 'anon', SUPABASE_KEY
+    
+    if not key:
+        raise Exception("SUPABASE_PUBLISHABLE_KEY o SUPABASE_ANON_KEY no está configurado")
+    
+    return role, key
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Obtiene el cliente httpx compartido.
+    
+    Un solo pool de conexiones persistentes para todas las llamadas a
+    Supabase, de modo que cada petición reutiliza conexiones TLS ya abiertas.
+    """
+    global _http_client
+    
+    if _http_client is None:
+        with _clients_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(**_http_pool_options())
+    
+    return _http_client
 
 
 def get_supabase_client(use_service_key: bool = False) -> Client:
     """
     Obtiene el cliente de Supabase.
     
+    Se crea un cliente por cada (url, rol de key) y se reutiliza; todos
+    comparten el pool HTTP de get_http_client(). Es seguro llamarlo desde
+    varios hilos.
+    
     Args:
         use_service_key: Si True, usa la service key (para operaciones admin).
                         Si False, usa la anon key (para operaciones públicas).
@@ -41,20 +120,87 @@ def get_supabase_client(use_service_key: bool = False) -> Client:
     Returns:
         Cliente de Supabase configurado
     """
-    global _supabase_client
+    role, key = _resolve_key(use_service_key)
     
-    if not SUPABASE_URL:
-        raise Exception("SUPABASE_URL no está configurado")
+    cache_key = (SUPABASE_URL, role)
+    client = _supabase_clients.get(cache_key)
+    if client is None:
+        http_client = get_http_client()
+        with _clients_lock:
+            client = _supabase_clients.get(cache_key)
+            if client is None:
+                client = create_client(
+                    SUPABASE_URL,
+                    key,
+                    options=SyncClientOptions(httpx_client=http_client)
+                )
+                _supabase_clients[cache_key] = client
     
-    key = SUPABASE_SERVICE_KEY if use_service_key and SUPABASE_SERVICE_KEY else SUPABASE_KEY
+    return client
+
+
+def _get_async_loop() -> asyncio.AbstractEventLoop:
+    """Event loop compartido (en un hilo propio) donde se ejecuta el repositorio asíncrono"""
+    global _async_loop
     
-    if not key:
-        raise Exception("SUPABASE_PUBLISHABLE_KEY o SUPABASE_ANON_KEY no está configurado")
+    if _async_loop is None:
+        with _clients_lock:
+            if _async_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='supabase-async', daemon=True).start()
+                _async_loop = loop
+    
+    return _async_loop
+
+
+def on_async_pool(coro_fn):
+    """
+    Decorador para corrutinas que usan get_async_supabase_client().
+    
+    Las vistas async de Flask se ejecutan cada una en un event loop nuevo,
+    y un pool httpx asíncrono no se puede reutilizar entre loops. Por eso la
+    corrutina se ejecuta en el loop compartido (donde vive el pool, con sus
+    conexiones TLS abiertas) y el loop de la vista solo espera su resultado.
+    """
+    @wraps(coro_fn)
+    async def wrapper(*args, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(coro_fn(*args, **kwargs), _get_async_loop())
+        return await asyncio.wrap_future(future)
+    return wrapper
+
+
+async def get_async_supabase_client(use_service_key: bool = False) -> AsyncClient:
+    """
+    Cliente asíncrono de Supabase compartido, uno por (url, rol de key).
+    
+    Solo se puede usar dentro de corrutinas decoradas con on_async_pool:
+    el cliente y su pool httpx pertenecen al event loop compartido.
+    
+    Uso:
+        @on_async_pool
+        async def leer():
+            client = await get_async_supabase_client(use_service_key=True)
+            ...
+    """
+    role, key = _resolve_key(use_service_key)
     
-    if _supabase_client is None:
-        _supabase_client = create_client(SUPABASE_URL, key)
+    cache_key = (SUPABASE_URL, role)
+    task = _async_clients.get(cache_key)
+    if task is None:
+        # Se guarda la tarea (no el cliente) para que dos corrutinas
+        # concurrentes compartan la misma creación
+        task = asyncio.ensure_future(acreate_client(
+            SUPABASE_URL,
+            key,
+            options=AsyncClientOptions(httpx_client=httpx.AsyncClient(**_http_pool_options()))
+        ))
+        _async_clients[cache_key] = task
     
-    return _supabase_client
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        _async_clients.pop(cache_key, None)
+        raise
 
 
 def get_db_connection():
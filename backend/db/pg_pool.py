@@ -0,0 +1,125 @@
+"""
+Pool de conexiones directas a PostgreSQL - Onsen Coffee
+Vía rápida para las consultas pesadas, sin el coste HTTP/JSON de PostgREST.
+
+Se activa con USE_DIRECT_SQL=1 y SUPABASE_DB_URL. Usa la conexión directa
+o el pooler de Supabase en modo sesión (puerto 5432): el modo transacción
+(6543) no conserva las sentencias preparadas entre transacciones.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+# Cargar variables de entorno (solo en desarrollo local)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except:
+    pass
+
+SUPABASE_DB_URL = os.environ.get('SUPABASE_DB_URL', '')
+USE_DIRECT_SQL = os.environ.get('USE_DIRECT_SQL', '0') == '1'
+PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', '1'))
+PG_POOL_MAX = int(os.environ.get('PG_POOL_MAX', '5'))
+PG_SSLMODE = os.environ.get('PG_SSLMODE', 'require')
+
+_pool = None
+_slots = threading.BoundedSemaphore(PG_POOL_MAX)
+_pool_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    """True si el repositorio debe enrutar las consultas pesadas por SQL directo"""
+    return USE_DIRECT_SQL and bool(SUPABASE_DB_URL)
+
+
+def _connection_factory():
+    import psycopg2.extensions
+
+    class PreparedConnection(psycopg2.extensions.connection):
+        """Conexión que recuerda qué sentencias tiene ya preparadas en el servidor"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared = set()
+
+    return PreparedConnection
+
+
+def get_pool():
+    """
+    Obtiene el pool de conexiones (se crea la primera vez).
+
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool con PG_POOL_MIN..PG_POOL_MAX conexiones
+    """
+    global _pool
+
+    if not SUPABASE_DB_URL:
+        raise Exception("SUPABASE_DB_URL no está configurado")
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                _pool = ThreadedConnectionPool(
+                    PG_POOL_MIN,
+                    PG_POOL_MAX,
+                    SUPABASE_DB_URL,
+                    sslmode=PG_SSLMODE,
+                    connection_factory=_connection_factory()
+                )
+    return _pool
+
+
+@contextmanager
+def connection():
+    """
+    Presta una conexión del pool durante el bloque `with`.
+
+    Si el pool está agotado se espera a que quede una libre (el pool está
+    acotado a PG_POOL_MAX). Al salir se hace commit, o rollback si hubo error.
+    """
+    pool = get_pool()
+    with _slots:
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def execute_prepared(conn, name: str, sql: str, params: tuple = ()):
+    """
+    Ejecuta una sentencia preparada en el servidor, preparándola la primera
+    vez que se usa en esta conexión.
+
+    Args:
+        conn: Conexión obtenida con connection()
+        name: Nombre de la sentencia (identificador SQL)
+        sql: Consulta con parámetros posicionales $1, $2...
+        params: Valores de los parámetros
+
+    Returns:
+        Lista de filas (tuplas)
+    """
+    with conn.cursor() as cur:
+        if name not in conn.prepared:
+            cur.execute(f"PREPARE {name} AS {sql}")
+            conn.prepared.add(name)
+
+        if params:
+            placeholders = ', '.join(['%s'] * len(params))
+            cur.execute(f"EXECUTE {name} ({placeholders})", params)
+        else:
+            cur.execute(f"EXECUTE {name}")
+        return cur.fetchall()
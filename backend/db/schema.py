@@ -52,6 +52,7 @@ ESTRUCTURA DE LA BASE DE DATOS ACTUAL
    - old_price: NUMERIC
    - is_active: BOOLEAN
    - reviews_count: INTEGER
+   - rating_sum: INTEGER (suma de los ratings; rating = rating_sum / reviews_count)
    - is_new: BOOLEAN
 
 3. ORDERS - Pedidos de clientes
@@ -97,6 +98,37 @@ ESTRUCTURA DE LA BASE DE DATOS ACTUAL
    - status: TEXT (active | unsubscribed)
    - source: TEXT
 
+========================================
+MIGRACIONES
+========================================
+
+- products.rating_sum (agregado incremental del rating):
+    ALTER TABLE products ADD COLUMN rating_sum INTEGER;
+  Después ejecutar `python rebuild_ratings.py` para rellenarlo a partir
+  de product_reviews (el mismo comando repara agregados desincronizados).
+
+- apply_product_rating_delta (suma o resta una reseña de forma atómica;
+  la llama store_repo por RPC al crear o borrar reseñas):
+    CREATE OR REPLACE FUNCTION apply_product_rating_delta(
+        p_product_id INTEGER, p_rating_delta INTEGER, p_count_delta INTEGER
+    ) RETURNS BOOLEAN LANGUAGE sql AS $$
+        WITH updated AS (
+            UPDATE products
+               SET rating_sum = GREATEST(rating_sum + p_rating_delta, 0),
+                   reviews_count = GREATEST(COALESCE(reviews_count, 0) + p_count_delta, 0),
+                   rating = CASE
+                       WHEN COALESCE(reviews_count, 0) + p_count_delta > 0
+                       THEN ROUND(GREATEST(rating_sum + p_rating_delta, 0)::NUMERIC
+                                  / (COALESCE(reviews_count, 0) + p_count_delta), 1)
+                       ELSE 0
+                   END
+             WHERE id = p_product_id AND rating_sum IS NOT NULL
+            RETURNING 1
+        )
+        SELECT EXISTS (SELECT 1 FROM updated);
+    $$;
+  Devuelve FALSE si el producto no tiene todavía rating_sum (o no existe).
+
 ========================================
 ACCESO A LA BASE DE DATOS
 ========================================
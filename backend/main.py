@@ -35,6 +35,18 @@ def create_app():
     register_rest_routes(app)
     register_admin_routes(app)
     
+    # Compresión gzip/brotli de respuestas JSON y HTML
+    from rest.compression import init_compression
+    init_compression(app)
+    
+    # Serialización JSON con orjson
+    from rest.json_provider import init_json
+    init_json(app)
+    
+    # Carrito en el servidor con cookie cart_id
+    from rest.cart_store import init_cart_store
+    init_cart_store(app)
+    
     return app
 
 # Crear instancia para uso directo
@@ -0,0 +1,285 @@
+"""
+Caché en memoria del catálogo de productos activos.
+
+El catálogo cambia pocas veces al día, así que las lecturas de la tienda
+se sirven desde una instantánea local con TTL configurable
+(CATALOG_CACHE_TTL, en segundos). Las escrituras de productos en
+store_repo invalidan la instantánea de inmediato.
+
+Las estructuras derivadas del catálogo (índices, etc.) se registran con
+on_reload() y se actualizan cada vez que se carga una instantánea nueva.
+Las que son caras de calcular pasan además una función prepare, que se
+ejecuta fuera del cerrojo, de modo que bajo él solo se publica el resultado.
+
+version() identifica el contenido de la instantánea vigente (un hash de
+los productos, igual en todas las instancias que tengan los mismos datos)
+y sirve para las ETags de los endpoints del catálogo.
+
+Con CATALOG_CACHE_MODE=swr (stale-while-revalidate) una instantánea
+caducada se sigue sirviendo al momento mientras un hilo en segundo plano
+la recarga; si la recarga falla se conserva la última buena. Nunca se
+sirve una instantánea con más de CATALOG_CACHE_MAX_STALE segundos de
+retraso sobre el TTL: pasado ese límite la lectura espera a Supabase.
+
+En Vercel (VERCEL definida) la función se congela al responder y un hilo
+en segundo plano no llegaría a terminar, así que allí la recarga de una
+instantánea caducada se hace dentro de la petición; si falla, se sigue
+sirviendo la última buena como en swr.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from repository import singleflight
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '300'))
+CATALOG_CACHE_MODE = os.environ.get('CATALOG_CACHE_MODE', 'ttl').lower()
+CATALOG_CACHE_MAX_STALE = float(os.environ.get('CATALOG_CACHE_MAX_STALE', '3600'))
+
+# Espera mínima entre recargas en segundo plano tras un fallo
+REFRESH_RETRY_DELAY = 5.0
+
+# En serverless no hay hilos que sobrevivan a la respuesta: se recarga en la petición
+REFRESH_INLINE = bool(os.environ.get('VERCEL'))
+
+logger = logging.getLogger(__name__)
+
+
+def _content_version(products):
+    """Hash de los productos (ya ordenados por id): no depende del proceso ni del orden de carga"""
+    digest = hashlib.sha1()
+    for product in products:
+        digest.update(json.dumps(product, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+class Snapshot:
+    """
+    Productos activos (ordenados por id) más índices hash por id y por slug,
+    construidos juntos. El orden no depende de cómo los devolvió Supabase,
+    así que dos instancias con la misma version() sirven las mismas respuestas.
+    """
+
+    __slots__ = ('products', 'by_id', 'by_slug', 'version', 'loaded_at')
+
+    def __init__(self, products):
+        products = sorted(products, key=lambda p: p.get('id'))
+        self.products = products
+        self.by_id = {str(p.get('id')): p for p in products}
+        self.by_slug = {p.get('slug'): p for p in products if p.get('slug')}
+        self.version = _content_version(products)
+        self.loaded_at = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.loaded_at
+
+    def is_fresh(self):
+        return self.age() < CATALOG_CACHE_TTL
+
+    def is_servable(self):
+        """Vigente, o caducada dentro del margen permitido en modo swr"""
+        if CATALOG_CACHE_MODE != 'swr':
+            return self.is_fresh()
+        return self.age() < CATALOG_CACHE_TTL + CATALOG_CACHE_MAX_STALE
+
+
+_lock = threading.Lock()
+_snapshot = None
+_listeners = []
+
+# Contador de escrituras e invalidaciones (detecta cargas que compiten con una escritura)
+_version = 0
+
+# Estado de la recarga en segundo plano (modo swr)
+_refreshing = False
+_refresh_failed_at = None
+
+
+def _servable_snapshot():
+    snapshot = _snapshot
+    return snapshot if snapshot is not None and snapshot.is_servable() else None
+
+
+def on_reload(callback, prepare=None):
+    """
+    Registra una función que se llama al publicar cada instantánea nueva.
+
+    Sin prepare, callback recibe la lista de productos. Con prepare,
+    prepare(productos) se calcula al cargar, fuera del cerrojo, y callback
+    recibe su resultado al publicar (si la carga no se descarta).
+    """
+    _listeners.append((callback, prepare))
+
+
+def generation():
+    """
+    Contador de escrituras e invalidaciones del catálogo.
+
+    Forma parte de las claves de single-flight de las lecturas de productos:
+    una lectura que llega después de invalidate() no se une a una consulta
+    que empezó antes de la escritura (y que devolvería los datos antiguos).
+    """
+    with _lock:
+        return _version
+
+
+def _reload(loader, started_at):
+    """Carga una instantánea nueva y la publica si no hubo escrituras desde started_at"""
+    global _snapshot, _version, _refresh_failed_at
+
+    snapshot = Snapshot(loader())
+    prepared = [
+        (callback, prepare(snapshot.products) if prepare is not None else snapshot.products)
+        for callback, prepare in list(_listeners)
+    ]
+
+    with _lock:
+        # Si se invalidó durante la carga, los datos pueden ser anteriores a la
+        # escritura: se devuelven a quien esperaba pero no se publican
+        if _version == started_at:
+            for callback, value in prepared:
+                callback(value)
+            _snapshot = snapshot
+            _version += 1
+            _refresh_failed_at = None
+    return snapshot
+
+
+def _refresh(loader):
+    """Recarga por single-flight; devuelve la instantánea nueva o None si falla"""
+    global _refresh_failed_at
+
+    try:
+        started_at = generation()
+        snapshot = singleflight.do(('catalog', started_at), lambda: _reload(loader, started_at))
+        failed_at = None
+    except Exception:
+        # Se sigue sirviendo la última instantánea buena hasta el límite de retraso
+        logger.exception("Fallo al recargar el catálogo")
+        snapshot = None
+        failed_at = time.monotonic()
+
+    with _lock:
+        _refresh_failed_at = failed_at
+    return snapshot
+
+
+def _recently_failed():
+    return _refresh_failed_at is not None and time.monotonic() - _refresh_failed_at < REFRESH_RETRY_DELAY
+
+
+def _background_refresh(loader):
+    global _refreshing
+
+    try:
+        _refresh(loader)
+    finally:
+        with _lock:
+            _refreshing = False
+
+
+def _refresh_inline(loader, stale):
+    """Recarga dentro de la petición (serverless); si falla devuelve la instantánea caducada"""
+    with _lock:
+        if _recently_failed():
+            return stale
+    return _refresh(loader) or stale
+
+
+def _schedule_refresh(loader):
+    """Lanza una única recarga en segundo plano, respetando la espera tras un fallo"""
+    global _refreshing
+
+    with _lock:
+        if _refreshing or _recently_failed():
+            return
+        _refreshing = True
+
+    threading.Thread(target=_background_refresh, args=(loader,), name='catalog-refresh', daemon=True).start()
+
+
+def get_snapshot(loader):
+    """
+    Devuelve la instantánea vigente del catálogo, recargándola si hace falta.
+
+    La recarga pasa por single-flight: si varias peticiones encuentran la
+    caché caducada a la vez, solo una consulta Supabase y las demás
+    comparten su resultado. La instantánea nueva (lista e índices por id y
+    slug) se construye completa antes de publicarse, así que los lectores
+    nunca ven una mezcla de versiones.
+
+    En modo swr, si la instantánea ha caducado pero sigue dentro de
+    CATALOG_CACHE_MAX_STALE, se devuelve tal cual y la recarga se hace en
+    segundo plano (en Vercel, dentro de esta misma llamada).
+
+    Args:
+        loader: Función sin argumentos que obtiene los productos de Supabase.
+                Solo se llama si la instantánea no existe o ha caducado.
+
+    Returns:
+        Snapshot compartido (no modificar sus productos)
+    """
+    snapshot = _servable_snapshot()
+    if snapshot is not None:
+        if not snapshot.is_fresh():
+            if REFRESH_INLINE:
+                return _refresh_inline(loader, snapshot)
+            _schedule_refresh(loader)
+        return snapshot
+
+    started_at = generation()
+    return singleflight.do(('catalog', started_at), lambda: _reload(loader, started_at))
+
+
+def get_products(loader):
+    """Devuelve la lista de productos activos de la instantánea (no modificar)"""
+    return get_snapshot(loader).products
+
+
+def peek():
+    """Devuelve los productos si la instantánea se puede servir, sin recargarla (o None)"""
+    snapshot = _servable_snapshot()
+    return snapshot.products if snapshot is not None else None
+
+
+def is_stale():
+    """True si se está sirviendo una instantánea caducada (modo swr, mientras se recarga)"""
+    snapshot = _servable_snapshot()
+    return snapshot is not None and not snapshot.is_fresh()
+
+
+def version():
+    """
+    Versión de la instantánea que se está sirviendo, o None si no hay ninguna.
+
+    Se deriva del contenido de los productos, así que dos instancias con el
+    mismo catálogo devuelven el mismo valor (y las mismas ETags), y mientras
+    no cambie cualquier lectura del catálogo produce el mismo resultado.
+    """
+    snapshot = _servable_snapshot()
+    return snapshot.version if snapshot is not None else None
+
+
+def invalidate():
+    """Descarta la instantánea; la siguiente lectura vuelve a Supabase"""
+    global _snapshot, _version
+
+    with _lock:
+        _snapshot = None
+        _version += 1
+
+
+def stats():
+    """Estado de la instantánea: modo, edad y si hay una recarga en curso"""
+    snapshot = _snapshot
+    return {
+        "mode": CATALOG_CACHE_MODE,
+        "age": round(snapshot.age(), 1) if snapshot is not None else None,
+        "fresh": snapshot is not None and snapshot.is_fresh(),
+        "refreshing": _refreshing,
+        "last_refresh_failed": _refresh_failed_at is not None,
+    }
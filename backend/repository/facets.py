@@ -0,0 +1,163 @@
+"""
+Índice de facetas (bitmaps) sobre el catálogo cacheado.
+
+Cada valor de faceta (categoría, tueste, origen, proceso, tramo de
+precio) guarda un bitmap (un int de Python) con un bit por producto de
+la instantánea. Filtrar es un AND de bitmaps y contar es un popcount,
+así que los productos filtrados y todos los contadores salen de una
+sola pasada sin tocar Supabase.
+"""
+
+import bisect
+import threading
+
+from repository import search_index
+
+FACET_FIELDS = ('category', 'roast', 'origin', 'process')
+
+# Tramos de precio: (etiqueta, mínimo incluido, máximo excluido)
+PRICE_BUCKETS = (
+    ('0-15', 0, 15),
+    ('15-25', 15, 25),
+    ('25-40', 25, 40),
+    ('40+', 40, None),
+)
+
+_lock = threading.Lock()
+_products = []
+_positions = {}        # product_id -> posición (bit) en la instantánea
+_bitmaps = {}          # faceta -> {valor: bitmap}
+_flags = {}            # 'featured' / 'is_new' -> bitmap
+_prices = []           # [(precio, bit)] ordenado por precio
+_all = 0
+
+
+def _price_bucket(price):
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return None
+
+
+def rebuild(products):
+    """Reconstruye todos los bitmaps a partir de la lista de productos"""
+    global _products, _positions, _bitmaps, _flags, _prices, _all
+
+    positions = {}
+    bitmaps = {field: {} for field in FACET_FIELDS + ('price',)}
+    flags = {'featured': 0, 'is_new': 0}
+    prices = []
+
+    for position, product in enumerate(products):
+        bit = 1 << position
+        positions[product.get('id')] = position
+
+        for field in FACET_FIELDS:
+            value = product.get(field)
+            if value:
+                bitmaps[field][value] = bitmaps[field].get(value, 0) | bit
+
+        price = product.get('price')
+        if price is not None:
+            price = float(price)
+            prices.append((price, bit))
+            label = _price_bucket(price)
+            if label:
+                bitmaps['price'][label] = bitmaps['price'].get(label, 0) | bit
+
+        for flag in flags:
+            if product.get(flag):
+                flags[flag] |= bit
+
+    prices.sort(key=lambda entry: entry[0])
+
+    with _lock:
+        _products = list(products)
+        _positions = positions
+        _bitmaps = bitmaps
+        _flags = flags
+        _prices = prices
+        _all = (1 << len(products)) - 1
+
+
+def _price_range_mask(min_price, max_price):
+    keys = [price for price, _ in _prices]
+    start = 0 if min_price is None else bisect.bisect_left(keys, min_price)
+    end = len(keys) if max_price is None else bisect.bisect_right(keys, max_price)
+    mask = 0
+    for _, bit in _prices[start:end]:
+        mask |= bit
+    return mask
+
+
+def _values_mask(field, values):
+    mask = 0
+    for value in values:
+        mask |= _bitmaps[field].get(value, 0)
+    return mask
+
+
+def _iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def search(query=None, selected=None, min_price=None, max_price=None, featured=None, is_new=None):
+    """
+    Filtra el catálogo y calcula los contadores de todas las facetas.
+
+    Args:
+        query: Texto libre (resuelto con el índice invertido)
+        selected: {faceta: [valores]} - dentro de una faceta los valores se combinan con OR
+        min_price, max_price, featured, is_new: Filtros adicionales
+
+    Returns:
+        Diccionario con los productos filtrados y las facetas
+        ({faceta: {valor: contador}}). El contador de cada faceta ignora
+        la selección de esa misma faceta, para que el usuario vea cuántos
+        productos obtendría al añadir otro valor.
+    """
+    selected = {field: values for field, values in (selected or {}).items() if values}
+
+    with _lock:
+        base = _all
+        ranked = None
+        matched = search_index.search(query) if query else None
+        if matched is not None:
+            ranked = [_positions[pid] for pid in matched if pid in _positions]
+            text_mask = 0
+            for position in ranked:
+                text_mask |= 1 << position
+            base &= text_mask
+        if min_price is not None or max_price is not None:
+            base &= _price_range_mask(min_price, max_price)
+        for flag, wanted in (('featured', featured), ('is_new', is_new)):
+            if wanted is not None:
+                base &= _flags[flag] if wanted else (_all & ~_flags[flag])
+
+        facet_masks = {field: _values_mask(field, values) for field, values in selected.items()}
+
+        matched = base
+        for mask in facet_masks.values():
+            matched &= mask
+
+        facets = {}
+        for field, value_bitmaps in _bitmaps.items():
+            others = base
+            for other, mask in facet_masks.items():
+                if other != field:
+                    others &= mask
+            facets[field] = {
+                value: (others & bitmap).bit_count()
+                for value, bitmap in sorted(value_bitmaps.items())
+            }
+
+        if ranked is not None:
+            positions = [p for p in ranked if matched >> p & 1]
+        else:
+            positions = list(_iter_bits(matched))
+        products = [dict(_products[p]) for p in positions]
+
+    return {"data": products, "count": len(products), "facets": facets}
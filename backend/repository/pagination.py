@@ -0,0 +1,109 @@
+"""
+Paginación por cursor (keyset) sobre (created_at, id).
+
+Los listados se ordenan por created_at DESC, id DESC. El cursor es la
+clave de la última fila devuelta codificada en base64, de modo que la
+página siguiente se pide con un filtro created_at/id en lugar de un
+OFFSET, y su coste no crece con el número de página.
+"""
+
+import base64
+import json
+import re
+import uuid
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Marca de tiempo ISO-8601 tal y como la devuelve PostgREST
+_TIMESTAMP_RE = re.compile(
+    r'^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?)?(Z|[+-]\d{2}(:?\d{2})?)?$'
+)
+
+
+def is_paginated(limit, cursor):
+    """True si la petición pide una página en lugar del listado completo"""
+    return limit is not None or cursor is not None
+
+
+def page_size(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def encode_cursor(row):
+    raw = json.dumps([row.get('created_at'), row.get('id')]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _valid_timestamp(value):
+    if not isinstance(value, str) or not _TIMESTAMP_RE.match(value):
+        return False
+    try:
+        datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    return True
+
+
+def _valid_id(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    if not isinstance(value, str):
+        return False
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+
+def decode_cursor(cursor):
+    """
+    Devuelve (created_at, id) o lanza ValueError si el cursor no es válido.
+
+    Los valores acaban dentro de un filtro de PostgREST (apply_keyset), así
+    que solo se aceptan una marca de tiempo ISO-8601 y un id entero o UUID.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Cursor no válido")
+    if not _valid_timestamp(created_at) or not _valid_id(row_id):
+        raise ValueError("Cursor no válido")
+    return created_at, row_id
+
+
+def apply_keyset(builder, cursor, limit):
+    """Añade a una consulta de PostgREST el orden, el filtro del cursor y el límite (+1)"""
+    builder = builder.order('created_at', desc=True).order('id', desc=True)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        builder = builder.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    # Una fila extra indica si hay página siguiente
+    return builder.limit(page_size(limit) + 1)
+
+
+def build_page(rows, limit):
+    """Recorta las filas a la página pedida y calcula next_cursor"""
+    size = page_size(limit)
+    data = rows[:size]
+    next_cursor = encode_cursor(data[-1]) if len(rows) > size else None
+    return {"data": data, "next_cursor": next_cursor}
+
+
+def paginate_list(rows, cursor, limit):
+    """Pagina en memoria una lista ya cargada (p. ej. la caché del catálogo)"""
+    ordered = sorted(rows, key=lambda r: (r.get('created_at') or '', r.get('id')), reverse=True)
+    if cursor:
+        key = decode_cursor(cursor)
+        ordered = [r for r in ordered if (r.get('created_at') or '', r.get('id')) < key]
+    return build_page(ordered, limit)
@@ -0,0 +1,164 @@
+"""
+Productos relacionados ("también te puede gustar") sobre el catálogo cacheado.
+
+Cada producto se codifica como un vector disperso de atributos (origen,
+tueste, proceso, categoría y cada nota de cata), con un peso por tipo de
+atributo. La similitud es el coseno entre vectores y, cada vez que se
+recarga el catálogo, se precalculan en una sola pasada los RELATED_TOP_K
+vecinos de todos los productos, así que servirlos es una consulta a un
+dict. Con NumPy el cálculo es una multiplicación de matrices por bloques;
+sin él se usa un índice invertido atributo -> productos (mismo resultado).
+
+Los vecinos se ordenan por (-similitud, id), con la similitud redondeada a
+SCORE_DECIMALS, así que los empates se resuelven igual con y sin NumPy.
+El cálculo (compute) es O(n²) y se hace fuera del cerrojo de la caché del
+catálogo; publish() solo sustituye el dict.
+"""
+
+import math
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional: sin él se usa el cálculo en Python puro
+    np = None
+
+RELATED_TOP_K = int(os.environ.get('RELATED_TOP_K', '8'))
+
+# Peso de cada tipo de atributo en el vector del producto
+FEATURE_WEIGHTS = {
+    'category': 2.0,
+    'origin': 1.5,
+    'roast': 1.0,
+    'process': 1.0,
+    'flavor_notes': 1.0,
+}
+
+# Filas por bloque en el producto de matrices (limita la memoria a BLOCK x n)
+BLOCK_SIZE = 512
+
+# Decimales con los que se comparan las similitudes (absorbe el error de coma flotante)
+SCORE_DECIMALS = 6
+
+_neighbours = {}       # product_id (str) -> [(product_id, similitud)] de mayor a menor
+
+
+def _features(product):
+    """Atributos del producto como {(tipo, valor): peso}"""
+    features = {}
+    for field, weight in FEATURE_WEIGHTS.items():
+        values = product.get(field)
+        if not values:
+            continue
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        for value in values:
+            value = str(value).strip().lower()
+            if value:
+                features[(field, value)] = weight
+    return features
+
+
+def _ranked(candidates, k):
+    """Los k mejores (posición, similitud) de mayor a menor similitud y, a igualdad, por posición"""
+    ranked = sorted((-round(score, SCORE_DECIMALS), position) for position, score in candidates)
+    return [(position, -score) for score, position in ranked[:k]]
+
+
+def _top_k_numpy(vectors, k):
+    vocabulary = {}
+    for features in vectors:
+        for feature in features:
+            vocabulary.setdefault(feature, len(vocabulary))
+
+    matrix = np.zeros((len(vectors), len(vocabulary)), dtype=np.float64)
+    for row, features in enumerate(vectors):
+        for feature, weight in features.items():
+            matrix[row, vocabulary[feature]] = weight
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1)
+
+    neighbours = []
+    count = len(vectors)
+    for start in range(0, count, BLOCK_SIZE):
+        scores = matrix[start:start + BLOCK_SIZE] @ matrix.T
+        rows = np.arange(scores.shape[0])
+        scores[rows, rows + start] = -1  # el propio producto no cuenta
+
+        # Candidatos: todo lo que alcanza la k-ésima similitud de la fila, empates
+        # incluidos (argpartition elegiría entre ellos de forma arbitraria)
+        candidates = scores > 1e-6
+        if k < count:
+            kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k]
+            candidates &= scores >= kth - 10 ** -SCORE_DECIMALS
+
+        for row, mask in enumerate(candidates):
+            columns = np.flatnonzero(mask)
+            neighbours.append(_ranked(((int(c), float(scores[row, c])) for c in columns), k))
+    return neighbours
+
+
+def _top_k_python(vectors, k):
+    norms = [math.sqrt(sum(w * w for w in features.values())) or 1.0 for features in vectors]
+
+    index = {}
+    for position, features in enumerate(vectors):
+        for feature, weight in features.items():
+            index.setdefault(feature, []).append((position, weight))
+
+    neighbours = []
+    for position, features in enumerate(vectors):
+        dots = {}
+        for feature, weight in features.items():
+            for other, other_weight in index[feature]:
+                if other != position:
+                    dots[other] = dots.get(other, 0.0) + weight * other_weight
+        neighbours.append(_ranked(
+            ((other, dot / (norms[position] * norms[other])) for other, dot in dots.items()), k
+        ))
+    return neighbours
+
+
+def compute(products):
+    """
+    Vecinos de todos los productos de la lista del catálogo (no publica nada).
+
+    Los productos se ordenan antes por id, así que el desempate por
+    posición es un desempate por id y no depende del orden de carga.
+    """
+    products = sorted(products, key=lambda product: product.get('id'))
+    vectors = [_features(product) for product in products]
+    if not vectors:
+        return {}
+
+    top_k = _top_k_numpy if np is not None else _top_k_python
+    ids = [product.get('id') for product in products]
+    return {
+        str(ids[position]): [(ids[other], round(score, 4)) for other, score in similar]
+        for position, similar in enumerate(top_k(vectors, RELATED_TOP_K))
+    }
+
+
+def publish(neighbours_by_id):
+    """Sustituye los vecinos servidos por los calculados con compute()"""
+    global _neighbours
+
+    _neighbours = neighbours_by_id
+
+
+def rebuild(products):
+    """Recalcula y publica los vecinos de todos los productos"""
+    publish(compute(products))
+
+
+def neighbours(product_id, limit=None):
+    """
+    Productos más parecidos a uno dado.
+
+    Returns:
+        Lista de (product_id, similitud) de mayor a menor, vacía si el
+        producto no está en el catálogo o no se parece a ningún otro
+    """
+    similar = _neighbours.get(str(product_id), [])
+    return similar[:limit] if limit else similar
@@ -0,0 +1,143 @@
+"""
+Índice invertido en memoria para la búsqueda de productos.
+
+Indexa por tokens los campos name, description, origin, process y
+flavor_notes del catálogo cacheado. Se sincroniza de forma incremental
+con cada recarga del catálogo: solo se re-tokenizan los productos que
+han cambiado y se eliminan los que ya no están activos.
+"""
+
+import bisect
+import re
+import threading
+import unicodedata
+
+# Peso de cada campo en la relevancia de un resultado
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'origin': 2.0,
+    'flavor_notes': 2.0,
+    'process': 1.5,
+    'description': 1.0,
+}
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'para', 'por', 'su', 'un', 'una', 'y',
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+_lock = threading.Lock()
+_postings = {}     # token -> {product_id: peso}
+_documents = {}    # product_id -> (firma, {token: peso})
+_vocabulary = []   # tokens ordenados, para búsqueda por prefijo
+
+
+def tokenize(text):
+    """Normaliza (minúsculas, sin tildes) y divide un texto en tokens"""
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(str(t) for t in text if t)
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def _signature(product):
+    return tuple(str(product.get(field)) for field in FIELD_WEIGHTS)
+
+
+def _weights(product):
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(product.get(field)):
+            weights[token] = weights.get(token, 0.0) + weight
+    return weights
+
+
+def _remove(product_id):
+    _, weights = _documents.pop(product_id)
+    for token in weights:
+        posting = _postings.get(token)
+        if posting is not None:
+            posting.pop(product_id, None)
+            if not posting:
+                del _postings[token]
+
+
+def _add(product_id, signature, weights):
+    _documents[product_id] = (signature, weights)
+    for token, weight in weights.items():
+        _postings.setdefault(token, {})[product_id] = weight
+
+
+def sync(products):
+    """
+    Sincroniza el índice con la lista de productos activos.
+
+    Solo se re-indexan los productos nuevos o modificados; los que ya no
+    aparecen en la lista se eliminan del índice.
+    """
+    global _vocabulary
+
+    with _lock:
+        seen = set()
+        for product in products:
+            product_id = product.get('id')
+            seen.add(product_id)
+            signature = _signature(product)
+            current = _documents.get(product_id)
+            if current is not None and current[0] == signature:
+                continue
+            if current is not None:
+                _remove(product_id)
+            _add(product_id, signature, _weights(product))
+
+        for product_id in [pid for pid in _documents if pid not in seen]:
+            _remove(product_id)
+
+        _vocabulary = sorted(_postings)
+
+
+def _matches(term):
+    """Postings de todos los tokens que empiezan por term (búsqueda por prefijo)"""
+    matched = {}
+    start = bisect.bisect_left(_vocabulary, term)
+    for token in _vocabulary[start:]:
+        if not token.startswith(term):
+            break
+        bonus = 1.0 if token == term else 0.5
+        for product_id, weight in _postings[token].items():
+            score = weight * bonus
+            if score > matched.get(product_id, 0.0):
+                matched[product_id] = score
+    return matched
+
+
+def search(query):
+    """
+    Busca productos cuyo texto contenga todos los términos de la consulta.
+
+    Returns:
+        Lista de ids de producto ordenada por relevancia, o None si la
+        consulta no tiene términos indexables (p. ej. solo palabras vacías),
+        que los llamadores tratan como "sin filtro de texto"
+    """
+    terms = tokenize(query)
+    if not terms:
+        return None
+
+    with _lock:
+        scores = None
+        # Intersectar empezando por el término más selectivo
+        for matched in sorted((_matches(t) for t in set(terms)), key=len):
+            if scores is None:
+                scores = matched
+            else:
+                scores = {pid: scores[pid] + s for pid, s in matched.items() if pid in scores}
+            if not scores:
+                return []
+
+    return sorted(scores, key=lambda pid: -scores[pid])
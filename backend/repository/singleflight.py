@@ -0,0 +1,97 @@
+"""
+Single-flight: agrupa llamadas idénticas concurrentes en una sola.
+
+Si llegan varias lecturas con la misma clave mientras la primera sigue en
+curso, las demás esperan y reciben su mismo resultado (o su misma
+excepción) en lugar de lanzar otra consulta a Supabase. stats() cuenta
+cuántas llamadas se ejecutaron y cuántas se ahorraron por tipo de clave.
+"""
+
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    """Conjunto de llamadas en curso, indexadas por clave"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executed = {}
+        self._coalesced = {}
+
+    def do(self, key, fn):
+        """
+        Ejecuta fn() salvo que ya haya una llamada en curso con la misma clave,
+        en cuyo caso espera y devuelve su resultado.
+
+        Args:
+            key: Tupla hashable; su primer elemento es el tipo de lectura (métricas)
+            fn: Función sin argumentos que hace la lectura
+        """
+        kind = key[0] if isinstance(key, tuple) else key
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._executed[kind] = self._executed.get(kind, 0) + 1
+            else:
+                self._coalesced[kind] = self._coalesced.get(kind, 0) + 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """Métricas: llamadas ejecutadas y agrupadas, por tipo de lectura"""
+        with self._lock:
+            kinds = sorted(set(self._executed) | set(self._coalesced))
+            return {
+                "executed": sum(self._executed.values()),
+                "coalesced": sum(self._coalesced.values()),
+                "in_flight": len(self._calls),
+                "by_kind": {
+                    kind: {
+                        "executed": self._executed.get(kind, 0),
+                        "coalesced": self._coalesced.get(kind, 0),
+                    }
+                    for kind in kinds
+                },
+            }
+
+
+# Grupo compartido por las lecturas del repositorio
+_group = Group()
+
+
+def do(key, fn):
+    return _group.do(key, fn)
+
+
+def stats():
+    return _group.stats()
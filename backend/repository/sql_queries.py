@@ -0,0 +1,101 @@
+"""
+Consultas pesadas por SQL directo (pool de db.pg_pool)
+
+Cada consulta es una sentencia preparada con parámetros opcionales
+(`$n IS NULL OR ...`), así que el servidor reutiliza el mismo plan sea
+cual sea la combinación de filtros. Las filas se construyen con to_jsonb
+para devolver exactamente la misma forma que PostgREST (fechas ISO,
+embeds de profiles/products).
+"""
+
+from db import pg_pool
+
+SEARCH_PRODUCTS_SQL = '''
+    SELECT to_jsonb(p)
+    FROM products p
+    WHERE p.is_active
+      AND ($1::text IS NULL OR p.category = $1)
+      AND ($2::text IS NULL OR p.roast = $2)
+      AND ($3::numeric IS NULL OR p.price >= $3)
+      AND ($4::numeric IS NULL OR p.price <= $4)
+      AND ($5::boolean IS NULL OR p.featured = $5)
+      AND ($6::boolean IS NULL OR p.is_new = $6)
+    ORDER BY p.created_at DESC, p.id DESC
+    LIMIT $7
+'''
+
+ORDERS_SQL = '''
+    SELECT to_jsonb(o)
+        || jsonb_build_object(
+            'profiles', (
+                SELECT jsonb_build_object('id', pr.id, 'email', pr.email, 'full_name', pr.full_name, 'phone', pr.phone)
+                FROM profiles pr
+                WHERE pr.id = o.user_id
+            ),
+            'items', COALESCE((
+                SELECT jsonb_agg(
+                    to_jsonb(oi) || jsonb_build_object(
+                        'products', jsonb_build_object('id', p.id, 'name', p.name, 'image', p.image, 'slug', p.slug)
+                    ) ORDER BY oi.id
+                )
+                FROM order_items oi
+                LEFT JOIN products p ON p.id = oi.product_id
+                WHERE oi.order_id = o.id
+            ), '[]'::jsonb)
+        )
+    FROM orders o
+    WHERE ($1::text IS NULL OR o.status = $1)
+      AND ($2::timestamptz IS NULL OR (o.created_at, o.id) < ($2, $3::integer))
+    ORDER BY o.created_at DESC, o.id DESC
+    LIMIT $4
+'''
+
+REVENUE_SQL = '''
+    SELECT jsonb_build_object('day', d.day, 'orders', d.orders, 'revenue', d.revenue)
+    FROM (
+        SELECT date_trunc('day', o.created_at)::date AS day,
+               count(*) AS orders,
+               COALESCE(sum(o.total), 0) AS revenue
+        FROM orders o
+        WHERE o.status <> 'cancelled'
+          AND o.created_at >= now() - make_interval(days => $1)
+        GROUP BY 1
+    ) d
+    ORDER BY d.day
+'''
+
+
+def _fetch(name, sql, params):
+    with pg_pool.connection() as conn:
+        return [row[0] for row in pg_pool.execute_prepared(conn, name, sql, params)]
+
+
+def searchProducts(category=None, roast=None, min_price=None, max_price=None,
+                   featured=None, is_new=None, limit=None):
+    """
+    Búsqueda de productos por filtros en una sola sentencia (más recientes primero).
+    
+    El texto libre no se resuelve aquí: lo resuelve siempre el índice
+    invertido (ver store_repo.searchProducts).
+    """
+    return _fetch('search_products_by_filters', SEARCH_PRODUCTS_SQL, (
+        category, roast, min_price, max_price, featured, is_new, limit
+    ))
+
+
+def getOrders(status_filter=None, limit=None, after=None):
+    """
+    Pedidos con perfil e items embebidos en una sola consulta (JOIN + jsonb_agg).
+
+    Args:
+        status_filter: Estado a filtrar (None = todos)
+        limit: Máximo de pedidos (None = sin límite)
+        after: Clave (created_at, id) del cursor de paginación, o None
+    """
+    created_at, order_id = after if after else (None, None)
+    return _fetch('orders_with_items', ORDERS_SQL, (status_filter, created_at, order_id, limit))
+
+
+def getRevenueByDay(days=30):
+    """Pedidos e ingresos por día (sin cancelados) de los últimos `days` días"""
+    return _fetch('revenue_by_day', REVENUE_SQL, (days,))
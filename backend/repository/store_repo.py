@@ -3,25 +3,125 @@ Repositorio de datos para Onsen Coffee - Versión Supabase
 Usa el cliente Python de Supabase en lugar de psycopg2
 """
 
+import os
+from datetime import datetime, timedelta, timezone
+
+from postgrest.exceptions import APIError
+
+from db import pg_pool
 from db.connection_supabase import get_supabase_client
+from repository import catalog_cache, facets, pagination, related, search_index, singleflight, sql_queries
+
+catalog_cache.on_reload(search_index.sync)
+catalog_cache.on_reload(facets.rebuild)
+catalog_cache.on_reload(related.publish, prepare=related.compute)
 
 def get_client():
     """Obtiene el cliente de Supabase con permisos de service_role"""
     return get_supabase_client(use_service_key=True)
 
+# ============================================
+# SPARSE FIELDSETS (?fields=)
+# ============================================
+
+PRODUCT_FIELDS = {
+    'id', 'created_at', 'updated_at', 'name', 'slug', 'description', 'short_description',
+    'origin', 'roast', 'process', 'altitude', 'flavor_notes', 'price', 'old_price',
+    'weight_grams', 'stock', 'category', 'image_url', 'featured', 'is_new', 'is_active',
+    'rating', 'reviews_count'
+}
+
+ORDER_FIELDS = {
+    'id', 'created_at', 'user_id', 'status', 'total', 'shipping_address', 'payment_intent',
+    'profiles', 'items'
+}
+
+ORDER_PROFILE_EMBED = 'profiles:user_id (id, email, full_name, phone)'
+
+def parseFields(fields, allowed):
+    """
+    Valida la lista de campos pedidos con ?fields=.
+    
+    Returns:
+        Lista de campos (siempre incluye 'id'), o None si se piden todos
+    """
+    if not fields:
+        return None
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown)}")
+    return list(dict.fromkeys(['id'] + list(fields)))
+
+def _project(rows, fields):
+    """Recorta cada fila a los campos pedidos (para datos que no vienen de un select)"""
+    if fields is None:
+        return rows
+    return [{k: row[k] for k in fields if k in row} for row in rows]
+
 # ============================================
 # PRODUCTS / COFFEES
 # ============================================
 
-def obtainCoffees():
+def _fetchActiveProducts():
+    """Descarga todos los productos activos desde Supabase"""
     client = get_client()
     response = client.table('products').select('*').eq('is_active', True).execute()
     return response.data
 
+def _cachedSnapshot():
+    """Instantánea del catálogo (productos e índices por id y slug)"""
+    return catalog_cache.get_snapshot(_fetchActiveProducts)
+
+def _cachedProducts():
+    """Productos activos servidos desde la caché del catálogo"""
+    return _cachedSnapshot().products
+
+def obtainCoffees(limit=None, cursor=None, fields=None):
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    products = [dict(p) for p in _cachedProducts()]
+    if pagination.is_paginated(limit, cursor):
+        page = pagination.paginate_list(products, cursor, limit)
+        page['data'] = _project(page['data'], fields)
+        return page
+    return _project(products, fields)
+
 def obtainCoffeeById(coffee_id):
-    client = get_client()
-    response = client.table('products').select('*').eq('id', coffee_id).eq('is_active', True).execute()
-    return response.data[0] if response.data else {"error": "Coffee not found"}
+    product = _cachedSnapshot().by_id.get(str(coffee_id))
+    if product is not None:
+        return dict(product)
+    
+    # No está en la instantánea (p. ej. creado desde otra instancia): ir a Supabase
+    def fetch():
+        client = get_client()
+        return client.table('products').select('*').eq('id', coffee_id).eq('is_active', True).execute().data
+    
+    data = singleflight.do(('product_by_id', catalog_cache.generation(), str(coffee_id)), fetch)
+    return dict(data[0]) if data else {"error": "Coffee not found"}
+
+def obtainCoffeesByIds(coffee_ids, fields=None):
+    """
+    Obtiene varios productos activos: desde la caché y, los que falten, en una sola consulta.
+    
+    Returns:
+        Productos en el orden pedido (sin repetidos); los ids que no existen
+        o no están activos no aparecen
+    """
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    ids = list(dict.fromkeys(str(cid) for cid in coffee_ids))
+    if not ids:
+        return []
+    
+    by_id = _cachedSnapshot().by_id
+    found = {cid: by_id[cid] for cid in ids if cid in by_id}
+    missing = [cid for cid in ids if cid not in found]
+    if missing:
+        def fetch():
+            client = get_client()
+            return client.table('products').select('*').in_('id', missing).eq('is_active', True).execute().data
+        
+        key = ('products_by_ids', catalog_cache.generation()) + tuple(sorted(missing))
+        found.update((str(p.get('id')), p) for p in singleflight.do(key, fetch))
+    return _project([dict(found[cid]) for cid in ids if cid in found], fields)
 
 def saveNewCoffee(coffee_data):
     """Guarda un nuevo producto con todos los campos"""
@@ -55,6 +155,7 @@ def saveNewCoffee(coffee_data):
     }
     
     response = client.table('products').insert(data).execute()
+    catalog_cache.invalidate()
     return {"status": "ok", "id": response.data[0]['id']}
 
 def updateCoffee(coffee_data):
@@ -92,57 +193,252 @@ def updateCoffee(coffee_data):
     if 'is_active' in coffee_data: data['is_active'] = coffee_data['is_active']
     
     response = client.table('products').update(data).eq('id', coffee_id).execute()
+    catalog_cache.invalidate()
     return {"status": "ok", "updated": len(response.data)}
 
 def deleteCoffee(coffee_id):
     """Desactiva un producto (soft delete)"""
     client = get_client()
     response = client.table('products').update({'is_active': False}).eq('id', coffee_id).execute()
+    catalog_cache.invalidate()
     return {"status": "ok"}
 
-def searchProducts(query, filters=None):
-    """Busca productos por texto y filtros"""
-    client = get_client()
-    
-    # Búsqueda básica por nombre o descripción
-    response = client.table('products').select('*').eq('is_active', True)
-    
+# Columnas por las que se permite ordenar una búsqueda
+SORTABLE_PRODUCT_FIELDS = {'created_at', 'price', 'name', 'rating', 'reviews_count'}
+
+def _parseSort(sort):
+    """(campo, descendente) a partir de ?sort=campo o ?sort=-campo"""
+    field = sort.lstrip('-')
+    if field not in SORTABLE_PRODUCT_FIELDS:
+        raise ValueError(f"No se puede ordenar por {field}")
+    return field, sort.startswith('-')
+
+def _sortProducts(products, field, desc):
+    """Ordena como PostgreSQL: NULLS LAST en ascendente, NULLS FIRST en descendente, desempate por id"""
+    return sorted(products, key=lambda p: (p.get(field) is None, p.get(field), p.get('id')), reverse=desc)
+
+def _matchesFilters(product, category, roast, min_price, max_price, featured, is_new):
+    """Los mismos filtros que _buildProductQuery, evaluados sobre un producto de la caché"""
+    price = product.get('price')
+    return (
+        (category is None or product.get('category') == category)
+        and (roast is None or product.get('roast') == roast)
+        and (min_price is None or (price is not None and float(price) >= min_price))
+        and (max_price is None or (price is not None and float(price) <= max_price))
+        and (featured is None or product.get('featured') == featured)
+        and (is_new is None or product.get('is_new') == is_new)
+    )
+
+def _buildProductQuery(client, category=None, roast=None, min_price=None, max_price=None,
+                       featured=None, is_new=None, select='*'):
+    """Compila los filtros de búsqueda en operadores de PostgREST"""
+    builder = client.table('products').select(select).eq('is_active', True)
+    
+    if category:
+        builder = builder.eq('category', category)
+    if roast:
+        builder = builder.eq('roast', roast)
+    if min_price is not None:
+        builder = builder.gte('price', min_price)
+    if max_price is not None:
+        builder = builder.lte('price', max_price)
+    if featured is not None:
+        builder = builder.eq('featured', featured)
+    if is_new is not None:
+        builder = builder.eq('is_new', is_new)
+    
+    return builder
+
+def searchProducts(query=None, category=None, roast=None, min_price=None, max_price=None,
+                   featured=None, is_new=None, sort=None, limit=None, fields=None):
+    """
+    Búsqueda de productos.
+    
+    El texto se resuelve siempre con el índice invertido sobre el catálogo
+    cacheado (que se carga si hace falta), y los filtros y el orden se
+    aplican sobre esa misma instantánea: el resultado no depende de si la
+    caché estaba caliente. Sin texto, los filtros se resuelven en la base de
+    datos (por SQL directo si está activado). Sin sort, los resultados con
+    texto van por relevancia y el resto por -created_at. `fields` limita
+    las columnas devueltas. Búsquedas idénticas concurrentes comparten una
+    sola consulta (single-flight).
+    """
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    order = _parseSort(sort) if sort else None
+    if query and not search_index.tokenize(query):
+        # Solo palabras vacías: equivale a no filtrar por texto
+        query = None
+    
+    key = ('search', catalog_cache.generation(), query, category, roast, min_price, max_price, featured, is_new,
+           order, limit, tuple(fields) if fields else None)
+    return list(singleflight.do(key, lambda: _searchProducts(
+        query, category, roast, min_price, max_price, featured, is_new, order, limit, fields
+    )))
+
+def _searchProducts(query, category, roast, min_price, max_price, featured, is_new, order, limit, fields):
     if query:
-        # Supabase no soporta LIKE directamente, así que filtramos en Python
-        all_products = response.execute().data
-        results = [p for p in all_products if 
-                   query.lower() in p.get('name', '').lower() or 
-                   query.lower() in p.get('description', '').lower()]
-        return results
+        by_id = _cachedSnapshot().by_id
+        products = [
+            dict(product)
+            for product in (by_id.get(str(pid)) for pid in search_index.search(query))
+            if product is not None
+            and _matchesFilters(product, category, roast, min_price, max_price, featured, is_new)
+        ]
+        if order is not None:
+            products = _sortProducts(products, *order)
+        return _project(products[:limit] if limit else products, fields)
+    
+    field, desc = order or ('created_at', True)
+    if pg_pool.is_enabled() and (field, desc) == ('created_at', True):
+        return _project(sql_queries.searchProducts(
+            category=category,
+            roast=roast,
+            min_price=min_price,
+            max_price=max_price,
+            featured=featured,
+            is_new=is_new,
+            limit=limit
+        ), fields)
     
-    return response.execute().data
+    client = get_client()
+    builder = _buildProductQuery(
+        client,
+        category=category,
+        roast=roast,
+        min_price=min_price,
+        max_price=max_price,
+        featured=featured,
+        is_new=is_new,
+        select=','.join(fields) if fields else '*'
+    ).order(field, desc=desc).order('id', desc=desc)
+    if limit:
+        builder = builder.limit(limit)
+    
+    return builder.execute().data
+
+def facetedSearch(query=None, selected=None, min_price=None, max_price=None, featured=None, is_new=None):
+    """Productos filtrados y contadores de facetas calculados sobre el catálogo cacheado"""
+    _cachedProducts()
+    return facets.search(
+        query=query,
+        selected=selected,
+        min_price=min_price,
+        max_price=max_price,
+        featured=featured,
+        is_new=is_new
+    )
+
+def getReadStats():
+    """Métricas de lectura: consultas ejecutadas y agrupadas por single-flight"""
+    return {
+        "catalog_version": catalog_cache.version(),
+        "catalog": catalog_cache.stats(),
+        "singleflight": singleflight.stats(),
+    }
 
 def getProductBySlug(slug):
     """Obtiene un producto por su slug"""
-    client = get_client()
-    response = client.table('products').select('*').eq('slug', slug).eq('is_active', True).execute()
-    return response.data[0] if response.data else None
-
-def getFeaturedProducts(limit=6):
-    """Obtiene productos destacados"""
-    client = get_client()
-    response = client.table('products').select('*').eq('is_active', True).eq('featured', True).limit(limit).execute()
-    return response.data
+    product = _cachedSnapshot().by_slug.get(slug)
+    if product is not None:
+        return dict(product)
+    
+    # No está en la instantánea: ir a Supabase
+    def fetch():
+        client = get_client()
+        return client.table('products').select('*').eq('slug', slug).eq('is_active', True).execute().data
+    
+    data = singleflight.do(('product_by_slug', catalog_cache.generation(), slug), fetch)
+    return dict(data[0]) if data else None
+
+def _newestFirst(products):
+    """Productos ordenados por created_at DESC, id DESC (el orden por defecto de los listados)"""
+    return sorted(products, key=lambda p: (p.get('created_at') or '', p.get('id')), reverse=True)
+
+def getFeaturedProducts(limit=None, fields=None):
+    """Obtiene productos destacados (más recientes primero) desde el catálogo cacheado"""
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    products = [dict(p) for p in _newestFirst(_cachedProducts()) if p.get('featured')]
+    return _project(products[:limit] if limit else products, fields)
+
+def getNewProducts(limit=None, fields=None):
+    """Obtiene productos nuevos (más recientes primero) desde el catálogo cacheado"""
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    products = [dict(p) for p in _newestFirst(_cachedProducts()) if p.get('is_new')]
+    return _project(products[:limit] if limit else products, fields)
+
+def getHomeCatalog(limit=6, fields=None):
+    """
+    Datos de la portada a partir de una única instantánea del catálogo.
+    
+    Returns:
+        dict con destacados, novedades, mejor valorados (más recientes
+        primero salvo top_rated) y un resumen por categoría
+    """
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    limit = max(1, min(limit, pagination.MAX_PAGE_SIZE))
+    products = _cachedSnapshot().products
+    newest = _newestFirst(products)
+    rated = sorted(
+        (p for p in products if p.get('reviews_count')),
+        key=lambda p: (-float(p.get('rating') or 0), -(p.get('reviews_count') or 0), p.get('id'))
+    )
+    
+    categories = {}
+    for product in products:
+        name = product.get('category') or 'coffee'
+        summary = categories.setdefault(name, {"category": name, "count": 0, "min_price": None, "max_price": None})
+        summary["count"] += 1
+        price = product.get('price')
+        if price is not None:
+            price = float(price)
+            if summary["min_price"] is None or price < summary["min_price"]:
+                summary["min_price"] = price
+            if summary["max_price"] is None or price > summary["max_price"]:
+                summary["max_price"] = price
+    
+    def pick(rows):
+        return _project([dict(p) for p in rows[:limit]], fields)
+    
+    return {
+        "featured": pick([p for p in newest if p.get('featured')]),
+        "new": pick([p for p in newest if p.get('is_new')]),
+        "top_rated": pick(rated),
+        "categories": sorted(categories.values(), key=lambda c: (-c["count"], c["category"])),
+        "total": len(products),
+    }
 
-def getNewProducts(limit=6):
-    """Obtiene productos nuevos"""
-    client = get_client()
-    response = client.table('products').select('*').eq('is_active', True).eq('is_new', True).limit(limit).execute()
-    return response.data
+def getRelatedProducts(product_id, limit=6, fields=None):
+    """
+    Productos parecidos a uno dado, precalculados sobre el catálogo cacheado.
+    
+    Returns:
+        Lista de productos (con su 'similarity'), o None si el producto no
+        está en el catálogo
+    """
+    fields = parseFields(fields, PRODUCT_FIELDS)
+    by_id = _cachedSnapshot().by_id
+    if str(product_id) not in by_id:
+        return None
+    
+    products = []
+    for other_id, similarity in related.neighbours(product_id, max(1, min(limit, related.RELATED_TOP_K))):
+        product = by_id.get(str(other_id))
+        if product is not None:
+            products.append(dict(product, similarity=similarity))
+    return _project(products, fields + ['similarity'] if fields else None)
 
 # ============================================
 # USERS - Adaptado para Supabase con profiles
 # ============================================
 
-def obtainUsers():
-    """Obtiene todos los usuarios (perfiles)"""
+def obtainUsers(limit=None, cursor=None):
+    """Obtiene todos los usuarios (perfiles), o una página si se pide limit/cursor"""
     client = get_client()
-    response = client.table('profiles').select('id, email, full_name, phone, role, created_at, updated_at').execute()
+    query = client.table('profiles').select('id, email, full_name, phone, role, created_at, updated_at')
+    if pagination.is_paginated(limit, cursor):
+        response = pagination.apply_keyset(query, cursor, limit).execute()
+        return pagination.build_page(response.data, limit)
+    response = query.execute()
     return response.data
 
 def obtainUserById(user_id):
@@ -173,7 +469,7 @@ def deleteUser(user_id):
 # ============================================
 
 def registerOrder(order_data):
-    """Registra un nuevo pedido con sus items"""
+    """Registra un nuevo pedido con sus items (dos peticiones, sea cual sea el tamaño)"""
     client = get_client()
     
     # Validar campos requeridos
@@ -200,18 +496,69 @@ def registerOrder(order_data):
     response = client.table('orders').insert(order_insert).execute()
     order_id = response.data[0]['id']
     
-    # Insertar items del pedido
-    for item in items:
-        item_insert = {
-            'order_id': order_id,
-            'product_id': item.get('product_id'),
-            'quantity': item.get('quantity'),
-            'price': item.get('price')
-        }
-        client.table('order_items').insert(item_insert).execute()
+    # Insertar todos los items del pedido en una sola petición
+    items_insert = [{
+        'order_id': order_id,
+        'product_id': item.get('product_id'),
+        'quantity': item.get('quantity'),
+        'price': item.get('price')
+    } for item in items]
+    
+    try:
+        client.table('order_items').insert(items_insert).execute()
+    except Exception:
+        # PostgREST inserta la lista en una transacción: si falla no queda ningún
+        # item, así que se elimina el pedido para no dejarlo a medias
+        client.table('orders').delete().eq('id', order_id).execute()
+        raise
     
     return {"status": "ok", "order_id": order_id, "total": total}
 
+# Pedidos por consulta de items: mantiene la URL del in_ corta y la respuesta
+# por debajo del límite de filas de PostgREST
+ORDER_ITEMS_BATCH = 200
+
+# Máximo de filas que PostgREST devuelve por respuesta (max-rows; 1000 en Supabase)
+POSTGREST_MAX_ROWS = int(os.environ.get('POSTGREST_MAX_ROWS', '1000'))
+
+def _attachOrderItems(client, orders):
+    """
+    Añade a cada pedido sus items, con una consulta por lote de pedidos (no una por pedido).
+    
+    Un lote puede tener más items que el tope de filas de PostgREST, así que
+    cada lote se lee por páginas de POSTGREST_MAX_ROWS hasta una página corta.
+    """
+    by_order = {}
+    for order in orders:
+        order['items'] = []
+        by_order[order['id']] = order
+    
+    order_ids = list(by_order)
+    for start in range(0, len(order_ids), ORDER_ITEMS_BATCH):
+        batch = order_ids[start:start + ORDER_ITEMS_BATCH]
+        offset = 0
+        while True:
+            items_response = client.table('order_items').select('''
+                *,
+                products (
+                    id,
+                    name,
+                    image,
+                    slug
+                )
+            ''').in_('order_id', batch).order('id').range(offset, offset + POSTGREST_MAX_ROWS - 1).execute()
+            
+            for item in items_response.data:
+                order = by_order.get(item.get('order_id'))
+                if order is not None:
+                    order['items'].append(item)
+            
+            if len(items_response.data) < POSTGREST_MAX_ROWS:
+                break
+            offset += POSTGREST_MAX_ROWS
+    
+    return orders
+
 def getOrderById(order_id):
     """Obtiene un pedido con sus items y perfil de usuario"""
     client = get_client()
@@ -247,37 +594,63 @@ def getOrderById(order_id):
     
     return order
 
-def getAllOrders():
-    """Obtiene todos los pedidos con información de usuario e items"""
+def _ordersViaSql(status_filter, limit, cursor):
+    """Listado de pedidos por SQL directo: pedidos, perfiles e items en una consulta"""
+    if not pagination.is_paginated(limit, cursor):
+        return sql_queries.getOrders(status_filter)
+    
+    after = pagination.decode_cursor(cursor) if cursor else None
+    rows = sql_queries.getOrders(status_filter, pagination.page_size(limit) + 1, after)
+    return pagination.build_page(rows, limit)
+
+def _orderSelect(fields):
+    """Select de PostgREST para pedidos; sin fields, todas las columnas y el perfil"""
+    if fields is None:
+        return f"*, {ORDER_PROFILE_EMBED}"
+    columns = [f for f in fields if f not in ('profiles', 'items')]
+    # La paginación por cursor necesita created_at e id, y los items el id
+    # (se quitan después con _project si no se pidieron)
+    for column in ('created_at', 'id'):
+        if column not in columns:
+            columns.append(column)
+    if 'profiles' in fields:
+        columns.append(ORDER_PROFILE_EMBED)
+    return ', '.join(columns)
+
+def getAllOrders(limit=None, cursor=None, fields=None):
+    """Obtiene todos los pedidos (o una página) con información de usuario e items"""
+    fields = parseFields(fields, ORDER_FIELDS)
+    
+    if pg_pool.is_enabled():
+        result = _ordersViaSql(None, limit, cursor)
+        if isinstance(result, dict):
+            result['data'] = _project(result['data'], fields)
+            return result
+        return _project(result, fields)
+    
     client = get_client()
-    response = client.table('orders').select('''
-        *,
-        profiles:user_id (
-            id,
-            email,
-            full_name,
-            phone
-        )
-    ''').order('created_at', desc=True).execute()
+    query = client.table('orders').select(_orderSelect(fields))
     
-    # Obtener items para cada pedido
-    orders = response.data
-    for order in orders:
-        items_response = client.table('order_items').select('''
-            *,
-            products (
-                id,
-                name,
-                image,
-                slug
-            )
-        ''').eq('order_id', order['id']).execute()
-        order['items'] = items_response.data
+    page = None
+    if pagination.is_paginated(limit, cursor):
+        page = pagination.build_page(pagination.apply_keyset(query, cursor, limit).execute().data, limit)
+        orders = page['data']
+    else:
+        orders = query.order('created_at', desc=True).execute().data
     
-    return orders
+    if fields is None or 'items' in fields:
+        _attachOrderItems(client, orders)
+    
+    if page is not None:
+        page['data'] = _project(orders, fields)
+        return page
+    return _project(orders, fields)
 
-def obtainOrders(status_filter='all'):
-    """Obtiene pedidos con filtro opcional de estado"""
+def obtainOrders(status_filter='all', limit=None, cursor=None):
+    """Obtiene pedidos (o una página) con filtro opcional de estado"""
+    if pg_pool.is_enabled():
+        return _ordersViaSql(status_filter if status_filter != 'all' else None, limit, cursor)
+    
     client = get_client()
     
     query = client.table('orders').select('''
@@ -293,23 +666,33 @@ def obtainOrders(status_filter='all'):
     if status_filter and status_filter != 'all':
         query = query.eq('status', status_filter)
     
-    response = query.order('created_at', desc=True).execute()
+    page = None
+    if pagination.is_paginated(limit, cursor):
+        page = pagination.build_page(pagination.apply_keyset(query, cursor, limit).execute().data, limit)
+        orders = page['data']
+    else:
+        orders = query.order('created_at', desc=True).execute().data
     
-    # Obtener items para cada pedido
-    orders = response.data
-    for order in orders:
-        items_response = client.table('order_items').select('''
-            *,
-            products (
-                id,
-                name,
-                image,
-                slug
-            )
-        ''').eq('order_id', order['id']).execute()
-        order['items'] = items_response.data
+    _attachOrderItems(client, orders)
     
-    return orders
+    return page if page is not None else orders
+
+def getRevenueByDay(days=30):
+    """Pedidos e ingresos por día (sin cancelados) de los últimos `days` días"""
+    if pg_pool.is_enabled():
+        return sql_queries.getRevenueByDay(days)
+    
+    client = get_client()
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    response = client.table('orders').select('created_at, total').neq('status', 'cancelled').gte('created_at', since).execute()
+    
+    by_day = {}
+    for order in response.data:
+        day = order['created_at'][:10]
+        count, revenue = by_day.get(day, (0, 0))
+        by_day[day] = (count + 1, revenue + float(order.get('total') or 0))
+    
+    return [{"day": day, "orders": count, "revenue": revenue} for day, (count, revenue) in sorted(by_day.items())]
 
 def updateOrderStatus(order_id, status):
     """Actualiza el estado de un pedido"""
@@ -343,15 +726,19 @@ def createContactMessage(data):
     response = client.table('contact_messages').insert(message_data).execute()
     return {"status": "ok", "id": response.data[0]['id']}
 
-def getAllContactMessages(status_filter=None):
-    """Obtiene todos los mensajes de contacto"""
+def getAllContactMessages(status_filter=None, limit=None, cursor=None):
+    """Obtiene todos los mensajes de contacto, o una página si se pide limit/cursor"""
     client = get_client()
     
+    query = client.table('contact_messages').select('*')
     if status_filter:
-        response = client.table('contact_messages').select('*').eq('status', status_filter).order('created_at', desc=True).execute()
-    else:
-        response = client.table('contact_messages').select('*').order('created_at', desc=True).execute()
+        query = query.eq('status', status_filter)
     
+    if pagination.is_paginated(limit, cursor):
+        response = pagination.apply_keyset(query, cursor, limit).execute()
+        return pagination.build_page(response.data, limit)
+    
+    response = query.order('created_at', desc=True).execute()
     return response.data
 
 def updateContactMessageStatus(message_id, status):
@@ -384,8 +771,8 @@ def createProductReview(data):
     
     response = client.table('product_reviews').insert(review_data).execute()
     
-    # Actualizar el rating promedio del producto
-    updateProductRating(data.get('product_id'))
+    # Actualizar los agregados de rating del producto
+    _applyRatingDelta(client, data.get('product_id'), int(data.get('rating')), 1)
     
     return {"status": "ok", "id": response.data[0]['id']}
 
@@ -395,43 +782,95 @@ def getProductReviews(product_id):
     response = client.table('product_reviews').select('*').eq('product_id', product_id).order('created_at', desc=True).execute()
     return response.data
 
+def _ratingFields(total, count):
+    """Columnas de rating de un producto a partir de la suma y el número de reseñas"""
+    return {
+        'rating': round(total / count, 1) if count else 0,
+        'rating_sum': total,
+        'reviews_count': count
+    }
+
+# Errores de PostgREST/PostgreSQL cuando la función RPC no existe
+MISSING_FUNCTION_CODES = {'PGRST202', '42883'}
+
+def _applyRatingDelta(client, product_id, rating, count_delta):
+    """
+    Suma (count_delta=1) o resta (count_delta=-1) una reseña a los agregados
+    rating_sum/reviews_count del producto, sin releer todas sus reseñas.
+    
+    El incremento lo hace la función SQL apply_product_rating_delta en un
+    único UPDATE (ver MIGRACIONES en db/schema.py), así que dos reseñas
+    simultáneas no se pisan. Si la migración no se ha aplicado todavía, se
+    recalcula el producto desde cero.
+    """
+    try:
+        applied = client.rpc('apply_product_rating_delta', {
+            'p_product_id': product_id,
+            'p_rating_delta': rating * count_delta,
+            'p_count_delta': count_delta
+        }).execute()
+    except APIError as e:
+        if e.code not in MISSING_FUNCTION_CODES:
+            raise
+        applied = None
+    
+    if applied is None or not applied.data:
+        # Sin la función, o producto anterior a los agregados: se calculan desde cero
+        updateProductRating(product_id)
+        return
+    catalog_cache.invalidate()
+
 def updateProductRating(product_id):
-    """Actualiza el rating promedio y contador de reseñas de un producto"""
+    """Recalcula desde cero el rating promedio y los agregados de un producto"""
     client = get_client()
     
     # Obtener todas las reseñas del producto
     reviews = client.table('product_reviews').select('rating').eq('product_id', product_id).execute()
     
-    if not reviews.data:
-        # Sin reseñas, establecer rating a 0
-        client.table('products').update({'rating': 0, 'reviews_count': 0}).eq('id', product_id).execute()
-        return
-    
-    # Calcular promedio
     total = sum([r['rating'] for r in reviews.data])
     count = len(reviews.data)
-    avg_rating = round(total / count, 1)
     
-    # Actualizar producto
-    client.table('products').update({
-        'rating': avg_rating,
-        'reviews_count': count
-    }).eq('id', product_id).execute()
+    client.table('products').update(_ratingFields(total, count)).eq('id', product_id).execute()
+    catalog_cache.invalidate()
+
+def rebuildProductRatings(batch_size=1000):
+    """
+    Reconstruye los agregados de rating de todos los productos a partir de
+    product_reviews. Es el comando de reparación de los agregados incrementales.
+    
+    Returns:
+        Número de productos actualizados
+    """
+    client = get_client()
+    
+    totals = {}
+    start = 0
+    while True:
+        reviews = client.table('product_reviews').select('id, product_id, rating').order('id').range(start, start + batch_size - 1).execute()
+        for review in reviews.data:
+            total, count = totals.get(review['product_id'], (0, 0))
+            totals[review['product_id']] = (total + review['rating'], count + 1)
+        if len(reviews.data) < batch_size:
+            break
+        start += batch_size
+    
+    products = client.table('products').select('id').execute()
+    for product in products.data:
+        total, count = totals.get(product['id'], (0, 0))
+        client.table('products').update(_ratingFields(total, count)).eq('id', product['id']).execute()
+    
+    catalog_cache.invalidate()
+    return len(products.data)
 
 def deleteProductReview(review_id):
     """Elimina una reseña de producto"""
     client = get_client()
     
-    # Obtener el product_id antes de eliminar
-    review = client.table('product_reviews').select('product_id').eq('id', review_id).execute()
+    # El DELETE devuelve las filas borradas: si dos peticiones borran la misma
+    # reseña a la vez, solo una la recibe y solo esa descuenta los agregados
+    deleted = client.table('product_reviews').delete().eq('id', review_id).execute()
     
-    if review.data:
-        product_id = review.data[0]['product_id']
-        
-        # Eliminar la reseña
-        client.table('product_reviews').delete().eq('id', review_id).execute()
-        
-        # Actualizar rating del producto
-        updateProductRating(product_id)
+    for review in deleted.data:
+        _applyRatingDelta(client, review['product_id'], review['rating'], -1)
     
     return {"status": "ok"}
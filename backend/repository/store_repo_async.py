@@ -0,0 +1,50 @@
+"""
+Repositorio asíncrono para Onsen Coffee - Versión Supabase
+Variante de store_repo para los endpoints que necesitan varias lecturas
+independientes: las consultas se lanzan a la vez con asyncio.gather, de
+modo que la latencia del endpoint se acerca a la de la consulta más lenta.
+"""
+
+import asyncio
+
+from db.connection_supabase import get_async_supabase_client, on_async_pool
+
+ORDER_SELECT = '''
+    *,
+    profiles:user_id (
+        id,
+        email,
+        full_name,
+        phone
+    )
+'''
+
+ORDER_ITEMS_SELECT = '''
+    *,
+    products (
+        id,
+        name,
+        image,
+        slug
+    )
+'''
+
+# ============================================
+# ORDERS
+# ============================================
+
+@on_async_pool
+async def getOrderById(order_id):
+    """Obtiene un pedido con sus items y perfil de usuario (ambas consultas en paralelo)"""
+    client = await get_async_supabase_client(use_service_key=True)
+    order_response, items_response = await asyncio.gather(
+        client.table('orders').select(ORDER_SELECT).eq('id', order_id).execute(),
+        client.table('order_items').select(ORDER_ITEMS_SELECT).eq('order_id', order_id).execute()
+    )
+
+    if not order_response.data:
+        return {"error": "Order not found"}
+
+    order = order_response.data[0]
+    order['items'] = items_response.data
+    return order
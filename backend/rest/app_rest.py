@@ -1,5 +1,7 @@
-from flask import Blueprint, jsonify, session, request
+from flask import Blueprint, current_app, jsonify, request
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Agregar backend al path
@@ -7,12 +9,37 @@ backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
 import repository.store_repo as repo
+import repository.store_repo_async as repo_async
+from rest import cart_store, cdn
+from rest.http_cache import catalog_etag
 
 api = Blueprint('api', __name__)
 
 def register_routes(app):
     app.register_blueprint(api, url_prefix='/api')
 
+def _productKeysById(response, coffee_id):
+    """Etiquetas de CDN de /coffees/<id> (no se cachea si el producto no existe)"""
+    if response.status_code == 200 and (response.get_json() or {}).get('error'):
+        return None
+    return [cdn.product_key(coffee_id)]
+
+def _productKeysBySlug(response, slug):
+    """Etiquetas de CDN de /products/slug/<slug>, a partir del id del producto"""
+    if response.status_code == 304:
+        return []
+    product = (response.get_json() or {}).get('data') or {}
+    return [cdn.product_key(product['id'])] if product.get('id') is not None else None
+
+def _pageArgs():
+    """Parámetros de paginación por cursor (limit, cursor) de la petición"""
+    return request.args.get('limit', type=int), request.args.get('cursor')
+
+def _fieldsArg():
+    """Campos pedidos con ?fields=a,b,c (None = todos)"""
+    fields = request.args.get('fields')
+    return [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
 @api.route("/")
 def init_rest():
     return jsonify({"status": "ok", "message": "Onsen Coffee API - Supabase Edition"})
@@ -20,23 +47,55 @@ def init_rest():
 # ============ PRODUCTS ENDPOINTS ============
 
 @api.route("/coffees")
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+@catalog_etag
 def obtainCoffees():
-    return jsonify(repo.obtainCoffees())
+    limit, cursor = _pageArgs()
+    try:
+        if 'ids' in request.args:
+            return _coffeesByIds(request.args['ids'])
+        return jsonify(repo.obtainCoffees(limit=limit, cursor=cursor, fields=_fieldsArg()))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+# Máximo de ids por petición en /coffees?ids=
+MAX_IDS_PER_REQUEST = 100
+
+def _coffeesByIds(raw_ids):
+    """/coffees?ids=1,2,3: productos en el orden pedido y los ids que no se encontraron"""
+    try:
+        ids = list(dict.fromkeys(int(part) for part in raw_ids.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError("ids debe ser una lista de enteros separados por comas")
+    if not ids:
+        raise ValueError("ids no puede estar vacío")
+    if len(ids) > MAX_IDS_PER_REQUEST:
+        raise ValueError(f"Máximo {MAX_IDS_PER_REQUEST} ids por petición")
+    
+    products = repo.obtainCoffeesByIds(ids, fields=_fieldsArg())
+    found = {str(p.get('id')) for p in products}
+    return jsonify({"data": products, "missing": [cid for cid in ids if str(cid) not in found]})
 
 @api.route("/coffees/<int:coffee_id>")
+@cdn.cache_policy(cdn.PRODUCT_POLICY, _productKeysById)
+@catalog_etag
 def obtainCoffeeById(coffee_id):
     return jsonify(repo.obtainCoffeeById(coffee_id))
 
 @api.route("/products/search", methods=["GET"])
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
 def searchProducts():
     try:
+        # ?category= / ?roast= vacíos equivalen a no filtrar (igual en todos los caminos)
         query = request.args.get('q')
-        category = request.args.get('category')
-        roast = request.args.get('roast')
+        category = request.args.get('category') or None
+        roast = request.args.get('roast') or None
         min_price = request.args.get('min_price', type=float)
         max_price = request.args.get('max_price', type=float)
         featured = request.args.get('featured', type=lambda x: x.lower() == 'true')
         is_new = request.args.get('new', type=lambda x: x.lower() == 'true')
+        sort = request.args.get('sort')
+        limit = request.args.get('limit', type=int)
         
         products = repo.searchProducts(
             query=query,
@@ -45,7 +104,10 @@ def searchProducts():
             min_price=min_price,
             max_price=max_price,
             featured=featured,
-            is_new=is_new
+            is_new=is_new,
+            sort=sort,
+            limit=limit,
+            fields=_fieldsArg()
         )
         
         return jsonify({
@@ -53,10 +115,38 @@ def searchProducts():
             "data": products,
             "count": len(products)
         })
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@api.route("/products/facets", methods=["GET"])
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+@catalog_etag
+def facetedSearch():
+    try:
+        selected = {}
+        for field in ('category', 'roast', 'origin', 'process', 'price'):
+            values = request.args.get(field)
+            if values:
+                selected[field] = [v for v in values.split(',') if v]
+        
+        result = repo.facetedSearch(
+            query=request.args.get('q'),
+            selected=selected,
+            min_price=request.args.get('min_price', type=float),
+            max_price=request.args.get('max_price', type=float),
+            featured=request.args.get('featured', type=lambda x: x.lower() == 'true'),
+            is_new=request.args.get('new', type=lambda x: x.lower() == 'true')
+        )
+        
+        return jsonify({"success": True, **result})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @api.route("/products/slug/<slug>")
+@cdn.cache_policy(cdn.PRODUCT_POLICY, _productKeysBySlug)
+@catalog_etag
 def getProductBySlug(slug):
     try:
         product = repo.getProductBySlug(slug)
@@ -67,155 +157,117 @@ def getProductBySlug(slug):
         return jsonify({"success": False, "error": str(e)}), 500
 
 @api.route("/products/featured")
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+@catalog_etag
 def getFeaturedProducts():
     try:
-        products = repo.searchProducts(featured=True)
+        products = repo.getFeaturedProducts(fields=_fieldsArg())
         return jsonify({"success": True, "data": products})
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @api.route("/products/new")
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+@catalog_etag
 def getNewProducts():
     try:
-        products = repo.searchProducts(is_new=True)
+        products = repo.getNewProducts(fields=_fieldsArg())
+        return jsonify({"success": True, "data": products})
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@api.route("/products/<int:product_id>/related")
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+@catalog_etag
+def getRelatedProducts(product_id):
+    try:
+        products = repo.getRelatedProducts(
+            product_id,
+            limit=request.args.get('limit', 6, type=int),
+            fields=_fieldsArg()
+        )
+        if products is None:
+            return jsonify({"success": False, "error": "Producto no encontrado"}), 404
         return jsonify({"success": True, "data": products})
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@api.route("/home")
+@cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+@catalog_etag
+def getHome():
+    """Portada en una sola petición: destacados, novedades, mejor valorados y categorías"""
+    try:
+        home = repo.getHomeCatalog(limit=request.args.get('limit', 6, type=int), fields=_fieldsArg())
+        return jsonify({"success": True, **home})
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 # ============ CART ENDPOINTS ============
 
-@api.route("/cart", methods=["GET"])
-def getCart():
-    cart = session.get('cart', [])
-    if not isinstance(cart, list):
-        cart = []
-        session['cart'] = cart
+def _enrichCart(cart):
+    """Enriquece los items del carrito con los datos de producto (una sola consulta)"""
+    coffees = {str(c.get('id')): c for c in repo.obtainCoffeesByIds(list(cart))}
     
-    # Enriquecer el carrito con datos de productos
     enriched_cart = []
-    for item in cart:
-        coffee_id = item.get('coffeeId')
-        if coffee_id:
-            coffee = repo.obtainCoffeeById(coffee_id)
-            if coffee and not coffee.get('error'):
-                enriched_item = {
-                    'id': coffee.get('id'),
-                    'name': coffee.get('name', 'Producto sin nombre'),
-                    'price': coffee.get('price', 0),
-                    'image_url': coffee.get('image_url'),
-                    'origin': coffee.get('origin', 'Origen desconocido'),
-                    'quantity': item.get('quantity', 1)
-                }
-                enriched_cart.append(enriched_item)
-    
-    return jsonify(enriched_cart)
+    for coffee_id, quantity in cart.items():
+        coffee = coffees.get(coffee_id)
+        if coffee:
+            enriched_cart.append({
+                'id': coffee.get('id'),
+                'name': coffee.get('name', 'Producto sin nombre'),
+                'price': coffee.get('price', 0),
+                'image_url': coffee.get('image_url'),
+                'origin': coffee.get('origin', 'Origen desconocido'),
+                'quantity': quantity
+            })
+    return enriched_cart
+
+@api.route("/cart", methods=["GET"])
+def getCart():
+    return jsonify(_enrichCart(cart_store.get_cart()))
 
 @api.route("/cart", methods=["POST"])
 def addToCart():
-    cart = session.get('cart', [])
-    if not isinstance(cart, list):
-        cart = []
-
     data = request.get_json()
     coffee_id = data.get("coffeeId")
     quantity = data.get("quantity", 1)
+    if coffee_id is None:
+        return jsonify({"error": "coffeeId es requerido"}), 400
 
-    found = False
-    for item in cart:
-        if item.get('coffeeId') == coffee_id:
-            item['quantity'] += quantity
-            found = True
-            break
-    
-    if not found:
-        cart.append({'coffeeId': coffee_id, 'quantity': quantity})
-
-    session['cart'] = cart
+    cart_store.add_item(coffee_id, quantity)
     
     # Devolver carrito enriquecido
-    enriched_cart = []
-    for item in cart:
-        cid = item.get('coffeeId')
-        if cid:
-            coffee = repo.obtainCoffeeById(cid)
-            if coffee and not coffee.get('error'):
-                enriched_item = {
-                    'id': coffee.get('id'),
-                    'name': coffee.get('name', 'Producto sin nombre'),
-                    'price': coffee.get('price', 0),
-                    'image_url': coffee.get('image_url'),
-                    'origin': coffee.get('origin', 'Origen desconocido'),
-                    'quantity': item.get('quantity', 1)
-                }
-                enriched_cart.append(enriched_item)
-    
-    return jsonify({"status": "ok", "cart": enriched_cart})
+    return jsonify({"status": "ok", "cart": _enrichCart(cart_store.get_cart())})
 
 @api.route("/cart/<int:coffee_id>", methods=["PUT"])
 def updateCartItem(coffee_id):
-    cart = session.get('cart', [])
-    if not isinstance(cart, list):
-        cart = []
-
     data = request.get_json()
     quantity = data.get("quantity", 1)
 
-    for item in cart:
-        if item.get('coffeeId') == coffee_id:
-            item['quantity'] = quantity
-            break
-
-    session['cart'] = cart
+    cart_store.update_item(coffee_id, quantity)
     
     # Devolver carrito enriquecido
-    enriched_cart = []
-    for item in cart:
-        cid = item.get('coffeeId')
-        if cid:
-            coffee = repo.obtainCoffeeById(cid)
-            if coffee and not coffee.get('error'):
-                enriched_item = {
-                    'id': coffee.get('id'),
-                    'name': coffee.get('name', 'Producto sin nombre'),
-                    'price': coffee.get('price', 0),
-                    'image_url': coffee.get('image_url'),
-                    'origin': coffee.get('origin', 'Origen desconocido'),
-                    'quantity': item.get('quantity', 1)
-                }
-                enriched_cart.append(enriched_item)
-    
-    return jsonify({"status": "ok", "cart": enriched_cart})
+    return jsonify({"status": "ok", "cart": _enrichCart(cart_store.get_cart())})
 
 @api.route("/cart/<int:coffee_id>", methods=["DELETE"])
 def removeFromCart(coffee_id):
-    cart = session.get('cart', [])
-    if not isinstance(cart, list):
-        cart = []
-    cart = [item for item in cart if item.get('coffeeId') != coffee_id]
-    session['cart'] = cart
+    cart_store.remove_item(coffee_id)
     
     # Devolver carrito enriquecido
-    enriched_cart = []
-    for item in cart:
-        cid = item.get('coffeeId')
-        if cid:
-            coffee = repo.obtainCoffeeById(cid)
-            if coffee and not coffee.get('error'):
-                enriched_item = {
-                    'id': coffee.get('id'),
-                    'name': coffee.get('name', 'Producto sin nombre'),
-                    'price': coffee.get('price', 0),
-                    'image_url': coffee.get('image_url'),
-                    'origin': coffee.get('origin', 'Origen desconocido'),
-                    'quantity': item.get('quantity', 1)
-                }
-                enriched_cart.append(enriched_item)
-    
-    return jsonify({"status": "ok", "cart": enriched_cart})
+    return jsonify({"status": "ok", "cart": _enrichCart(cart_store.get_cart())})
 
 @api.route("/cart", methods=["DELETE"])
 def clearCart():
-    session['cart'] = []
+    cart_store.clear_cart()
     return jsonify({"status": "ok", "cart": []})
 
 # ============ ORDERS ENDPOINTS ============
@@ -233,7 +285,7 @@ def createOrder():
             return jsonify({"error": "El carrito está vacío"}), 400
         
         result = repo.registerOrder(data)
-        session['cart'] = []
+        cart_store.clear_cart()
         return jsonify(result)
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
@@ -241,11 +293,14 @@ def createOrder():
         return jsonify({"error": f"Error al procesar pedido: {str(e)}"}), 500
 
 @api.route("/orders/<int:order_id>")
-def getOrder(order_id):
-    order = repo.getOrderById(order_id)
-    if not order:
-        return jsonify({"error": "Pedido no encontrado"}), 404
-    return jsonify(order)
+async def getOrder(order_id):
+    try:
+        order = await repo_async.getOrderById(order_id)
+        if not order or order.get('error'):
+            return jsonify({"error": "Pedido no encontrado"}), 404
+        return jsonify(order)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @api.route("/orders/by-email/<email>")
 def getOrdersByEmail(email):
@@ -254,7 +309,11 @@ def getOrdersByEmail(email):
 
 @api.route("/orders")
 def getAllOrders():
-    orders = repo.getAllOrders()
+    limit, cursor = _pageArgs()
+    try:
+        orders = repo.getAllOrders(limit=limit, cursor=cursor, fields=_fieldsArg())
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     return jsonify(orders)
 
 @api.route("/orders/<int:order_id>/status", methods=["PUT"])
@@ -294,8 +353,13 @@ def createContactMessage():
 def getAllContactMessages():
     try:
         status = request.args.get('status')
-        messages = repo.getAllContactMessages(status)
+        limit, cursor = _pageArgs()
+        messages = repo.getAllContactMessages(status, limit=limit, cursor=cursor)
+        if isinstance(messages, dict):
+            return jsonify({"success": True, **messages})
         return jsonify({"success": True, "data": messages})
+    except ValueError as ve:
+        return jsonify({"success": False, "error": str(ve)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -357,6 +421,7 @@ def createProductReview(product_id):
         if 'error' in result:
             return jsonify({"success": False, "error": result['error']}), 400
         
+        cdn.purge_product(product_id)
         return jsonify({"success": True, "message": "Review creada exitosamente", "data": result}), 201
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -365,5 +430,80 @@ def createProductReview(product_id):
 
 @api.route("/users")
 def obtainUsers():
-    return jsonify(repo.obtainUsers())
+    limit, cursor = _pageArgs()
+    try:
+        return jsonify(repo.obtainUsers(limit=limit, cursor=cursor))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+
+# ============ BATCH ============
+
+# Máximo de peticiones por lote y de peticiones de un mismo lote que corren a la vez
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', '10'))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+# Cabeceras de la petición original que se reenvían a cada subpetición
+BATCH_FORWARD_HEADERS = ('Cookie', 'Authorization', 'Accept-Language')
+
+def _batchPathError(path):
+    """Motivo por el que una ruta no se admite en un lote, o None si es válida"""
+    if not isinstance(path, str) or not path.startswith('/api/') or '//' in path:
+        return "Solo se admiten rutas internas que empiecen por /api/"
+    if path.split('?', 1)[0].rstrip('/') == '/api/batch':
+        return "Un lote no puede contener /api/batch"
+    return None
 
+def _dispatchGet(app, path, headers):
+    """
+    Ejecuta un GET interno contra la app, sin pasar por la red.
+    
+    Returns:
+        (resultado para el cuerpo del lote, cabeceras Set-Cookie de la subrespuesta)
+    """
+    try:
+        response = app.test_client(use_cookies=False).get(path, headers=headers)
+        body = response.get_json(silent=True)
+        if body is None:
+            body = response.get_data(as_text=True)
+        return {"path": path, "status": response.status_code, "body": body}, response.headers.getlist('Set-Cookie')
+    except Exception as e:
+        return {"path": path, "status": 500, "body": {"success": False, "error": str(e)}}, []
+
+@api.route("/batch", methods=["POST"])
+def batch():
+    """
+    Varios GET de la API en una sola petición.
+    
+    Body: {"requests": ["/api/products/slug/x", "/api/products/3/reviews", "/api/cart"]}
+    Devuelve las respuestas en el mismo orden, cada una con su código de estado.
+    
+    Cada lote usa sus propios hilos (hasta BATCH_WORKERS), así que una
+    subpetición lenta solo retrasa su lote. Las cookies que fijen las
+    subpeticiones (p. ej. un cart_id nuevo) se reenvían en la respuesta;
+    si varias fijan la misma, gana la de la última ruta del lote.
+    """
+    data = request.get_json(silent=True) or {}
+    paths = data.get('requests')
+    if not isinstance(paths, list) or not paths:
+        return jsonify({"success": False, "error": "Se requiere una lista 'requests' con rutas"}), 400
+    if len(paths) > BATCH_MAX_REQUESTS:
+        return jsonify({"success": False, "error": f"Máximo {BATCH_MAX_REQUESTS} peticiones por lote"}), 400
+    for path in paths:
+        error = _batchPathError(path)
+        if error:
+            return jsonify({"success": False, "error": f"{error}: {path}"}), 400
+    
+    app = current_app._get_current_object()
+    headers = {name: request.headers[name] for name in BATCH_FORWARD_HEADERS if name in request.headers}
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(paths)), thread_name_prefix='api-batch') as pool:
+        results = list(pool.map(lambda path: _dispatchGet(app, path, headers), paths))
+    
+    cookies = {}
+    for _, set_cookies in results:
+        for header in set_cookies:
+            cookies[header.split('=', 1)[0]] = header
+    
+    response = jsonify({"success": True, "responses": [result for result, _ in results]})
+    for header in cookies.values():
+        response.headers.add('Set-Cookie', header)
+    return response
@@ -0,0 +1,376 @@
+"""
+Carrito en el servidor, identificado por una cookie corta (cart_id).
+
+El carrito es un dict product_id -> cantidad, así que añadir, cambiar o
+quitar un producto es O(1) y la cookie no crece con el carrito. El
+almacén se elige con CART_STORE:
+- memory: dict en memoria del proceso, acotado a CART_MEMORY_MAX carritos
+  (desarrollo; por defecto fuera de Vercel)
+- sqlite: fichero SQLite local en CART_STORE_PATH (tests, una sola máquina)
+- redis: Redis o compatible en CART_STORE_URL (por defecto en Vercel, donde
+  la memoria no se comparte entre instancias)
+- session: el dict dentro de la cookie de sesión firmada de Flask, sin
+  cookie cart_id
+
+Si se pide redis sin CART_STORE_URL (o sin el paquete redis), se avisa en
+el log y se usa session, para que la tienda siga funcionando.
+
+Los carritos antiguos (session['cart'] como lista de {'coffeeId',
+'quantity'}) se migran al almacén la primera vez que se usan.
+"""
+
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from flask import current_app, g, request, session
+
+try:
+    import redis
+except ImportError:  # redis solo hace falta con CART_STORE=redis (sin él se usa session)
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CART_STORE = os.environ.get('CART_STORE') or ('redis' if os.environ.get('VERCEL') else 'memory')
+CART_STORE_PATH = os.environ.get('CART_STORE_PATH', 'carts.sqlite3')
+CART_STORE_URL = os.environ.get('CART_STORE_URL', '')
+CART_COOKIE = os.environ.get('CART_COOKIE', 'cart_id')
+CART_TTL = int(os.environ.get('CART_TTL', str(30 * 24 * 3600)))
+CART_MEMORY_MAX = int(os.environ.get('CART_MEMORY_MAX', '10000'))
+
+_CART_ID_RE = re.compile(r'^[A-Za-z0-9_-]{16}$')
+
+
+def _new_cart_id():
+    return secrets.token_urlsafe(12)
+
+
+class MemoryCartStore:
+    """
+    Carritos en memoria del proceso, con caducidad por inactividad.
+
+    Los carritos se guardan del menos al más recientemente usado, así que
+    los caducados están siempre al principio: en cada acceso se descartan
+    los caducados y, por encima de max_carts, los menos usados (LRU).
+    """
+
+    keyed = True
+
+    def __init__(self, ttl=CART_TTL, max_carts=CART_MEMORY_MAX):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._lock = threading.Lock()
+        self._carts = OrderedDict()   # cart_id -> [caduca_en, items]
+
+    def _sweep(self, now):
+        while self._carts:
+            expires_at, _ = next(iter(self._carts.values()))
+            if expires_at >= now and len(self._carts) <= self.max_carts:
+                break
+            self._carts.popitem(last=False)
+
+    def _cart(self, cart_id, create=False):
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._carts.get(cart_id)
+        if entry is None:
+            if not create:
+                return None
+            entry = [0, {}]
+            self._carts[cart_id] = entry
+        entry[0] = now + self.ttl
+        self._carts.move_to_end(cart_id)
+        self._sweep(now)
+        return entry[1]
+
+    def get(self, cart_id):
+        with self._lock:
+            return dict(self._cart(cart_id) or {})
+
+    def add(self, cart_id, product_id, quantity):
+        with self._lock:
+            items = self._cart(cart_id, create=True)
+            items[product_id] = items.get(product_id, 0) + quantity
+
+    def update(self, cart_id, product_id, quantity):
+        with self._lock:
+            items = self._cart(cart_id)
+            if items is not None and product_id in items:
+                items[product_id] = quantity
+
+    def remove(self, cart_id, product_id):
+        with self._lock:
+            items = self._cart(cart_id)
+            if items is not None:
+                items.pop(product_id, None)
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+class SQLiteCartStore:
+    """Carritos en un fichero SQLite (una fila por producto)"""
+
+    keyed = True
+
+    def __init__(self, path=CART_STORE_PATH, ttl=CART_TTL):
+        self.path = path
+        self.ttl = ttl
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cart_items ("
+                " cart_id TEXT NOT NULL,"
+                " product_id TEXT NOT NULL,"
+                " quantity INTEGER NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (cart_id, product_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cart_items_updated_at ON cart_items (updated_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _touch(self, conn, cart_id):
+        now = time.time()
+        conn.execute("UPDATE cart_items SET updated_at = ? WHERE cart_id = ?", (now, cart_id))
+        conn.execute("DELETE FROM cart_items WHERE updated_at < ?", (now - self.ttl,))
+
+    def get(self, cart_id):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT product_id, quantity FROM cart_items"
+                " WHERE cart_id = ? AND updated_at >= ? ORDER BY rowid",
+                (cart_id, time.time() - self.ttl)
+            ).fetchall()
+        return dict(rows)
+
+    def add(self, cart_id, product_id, quantity):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO cart_items (cart_id, product_id, quantity, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity",
+                (cart_id, product_id, quantity, time.time())
+            )
+            self._touch(conn, cart_id)
+
+    def update(self, cart_id, product_id, quantity):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE cart_items SET quantity = ? WHERE cart_id = ? AND product_id = ?",
+                (quantity, cart_id, product_id)
+            )
+            self._touch(conn, cart_id)
+
+    def remove(self, cart_id, product_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM cart_items WHERE cart_id = ? AND product_id = ?", (cart_id, product_id))
+            self._touch(conn, cart_id)
+
+    def clear(self, cart_id):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM cart_items WHERE cart_id = ?", (cart_id,))
+
+
+class RedisCartStore:
+    """Carritos en Redis: un hash por carrito, con caducidad por inactividad"""
+
+    keyed = True
+
+    def __init__(self, url=None, ttl=CART_TTL, client=None):
+        self.ttl = ttl
+        if client is not None:
+            self._client = client
+            return
+        url = url or CART_STORE_URL
+        if redis is None:
+            raise RuntimeError("CART_STORE=redis requiere el paquete redis (pip install redis)")
+        if not url:
+            raise RuntimeError("CART_STORE=redis requiere CART_STORE_URL")
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(cart_id):
+        return f'cart:{cart_id}'
+
+    def get(self, cart_id):
+        items = self._client.hgetall(self._key(cart_id))
+        return {product_id: int(quantity) for product_id, quantity in items.items()}
+
+    def add(self, cart_id, product_id, quantity):
+        pipe = self._client.pipeline()
+        pipe.hincrby(self._key(cart_id), product_id, quantity)
+        pipe.expire(self._key(cart_id), self.ttl)
+        pipe.execute()
+
+    def update(self, cart_id, product_id, quantity):
+        if self._client.hexists(self._key(cart_id), product_id):
+            pipe = self._client.pipeline()
+            pipe.hset(self._key(cart_id), product_id, quantity)
+            pipe.expire(self._key(cart_id), self.ttl)
+            pipe.execute()
+
+    def remove(self, cart_id, product_id):
+        pipe = self._client.pipeline()
+        pipe.hdel(self._key(cart_id), product_id)
+        pipe.expire(self._key(cart_id), self.ttl)
+        pipe.execute()
+
+    def clear(self, cart_id):
+        self._client.delete(self._key(cart_id))
+
+
+class SessionCartStore:
+    """El carrito dentro de la cookie de sesión firmada (cart_id se ignora)"""
+
+    keyed = False
+
+    def _items(self):
+        items = session.get('cart_items')
+        return dict(items) if isinstance(items, dict) else {}
+
+    def get(self, cart_id):
+        return self._items()
+
+    def add(self, cart_id, product_id, quantity):
+        items = self._items()
+        items[product_id] = items.get(product_id, 0) + quantity
+        session['cart_items'] = items
+
+    def update(self, cart_id, product_id, quantity):
+        items = self._items()
+        if product_id in items:
+            items[product_id] = quantity
+            session['cart_items'] = items
+
+    def remove(self, cart_id, product_id):
+        items = self._items()
+        items.pop(product_id, None)
+        session['cart_items'] = items
+
+    def clear(self, cart_id):
+        session.pop('cart_items', None)
+
+
+_BACKENDS = {
+    'memory': MemoryCartStore,
+    'sqlite': SQLiteCartStore,
+    'redis': RedisCartStore,
+    'session': SessionCartStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Almacén de carritos configurado con CART_STORE (se crea una vez)"""
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if CART_STORE not in _BACKENDS:
+                    raise RuntimeError(f"CART_STORE no válido: {CART_STORE}")
+                try:
+                    _store = _BACKENDS[CART_STORE]()
+                except RuntimeError as e:
+                    if CART_STORE != 'redis':
+                        raise
+                    logger.warning(f"{e}; el carrito se guarda en la cookie de sesión")
+                    _store = SessionCartStore()
+    return _store
+
+
+def _cart_id(create):
+    """cart_id de la petición; si no hay y create es True, se genera uno nuevo"""
+    if 'cart_id' in g:
+        return g.cart_id
+
+    cart_id = request.cookies.get(CART_COOKIE)
+    if cart_id is None or not _CART_ID_RE.match(cart_id):
+        if not create:
+            return None
+        cart_id = _new_cart_id()
+        g.new_cart_id = cart_id
+    g.cart_id = cart_id
+    return cart_id
+
+
+def _migrate_legacy_cart():
+    """Pasa al almacén el carrito antiguo de la sesión (lista de dicts), si lo hay"""
+    legacy = session.pop('cart', None)
+    if not isinstance(legacy, list) or not legacy:
+        return
+
+    cart_id = _cart_id(create=True)
+    store = get_store()
+    for item in legacy:
+        if isinstance(item, dict) and item.get('coffeeId') is not None:
+            store.add(cart_id, str(item['coffeeId']), int(item.get('quantity', 1)))
+
+
+def _prepare(create):
+    if 'cart' in session:
+        _migrate_legacy_cart()
+    return _cart_id(create)
+
+
+def get_cart():
+    """Carrito de la petición actual: dict product_id (str) -> cantidad"""
+    cart_id = _prepare(create=False)
+    store = get_store()
+    if cart_id is None and store.keyed:
+        return {}
+    return store.get(cart_id)
+
+
+def add_item(product_id, quantity=1):
+    """Suma quantity unidades del producto al carrito"""
+    get_store().add(_prepare(create=True), str(product_id), int(quantity))
+
+
+def update_item(product_id, quantity):
+    """Fija la cantidad de un producto que ya está en el carrito"""
+    get_store().update(_prepare(create=True), str(product_id), int(quantity))
+
+
+def remove_item(product_id):
+    """Quita un producto del carrito"""
+    get_store().remove(_prepare(create=True), str(product_id))
+
+
+def clear_cart():
+    """Vacía el carrito de la petición actual"""
+    cart_id = _prepare(create=False)
+    store = get_store()
+    if cart_id is not None or not store.keyed:
+        store.clear(cart_id)
+
+
+def _set_cart_cookie(response):
+    """after_request: envía la cookie cart_id cuando se acaba de crear el carrito"""
+    cart_id = g.get('new_cart_id')
+    if cart_id is not None and get_store().keyed:
+        response.set_cookie(
+            CART_COOKIE,
+            cart_id,
+            max_age=CART_TTL,
+            httponly=True,
+            secure=current_app.config.get('SESSION_COOKIE_SECURE', False),
+            samesite=current_app.config.get('SESSION_COOKIE_SAMESITE') or 'Lax'
+        )
+    return response
+
+
+def init_cart_store(app):
+    """Registra la cookie del carrito en una app Flask"""
+    app.after_request(_set_cart_cookie)
@@ -0,0 +1,130 @@
+"""
+Caché en el CDN (Vercel Edge) para los endpoints públicos del catálogo.
+
+Las respuestas cacheables llevan Cache-Control con s-maxage y
+stale-while-revalidate, y una cabecera de etiquetas (surrogate keys):
+- 'catalog' en los listados
+- 'product-<id>' en las fichas de producto
+
+Las escrituras de productos del admin llaman a purge_product(), que
+invalida en el CDN los listados y solo la ficha del producto afectado.
+Sin CDN_PURGE_URL configurado la purga no hace nada.
+
+La purga se hace dentro de la petición del admin (con un timeout de 3 s),
+porque en Vercel la función puede quedar congelada en cuanto responde.
+Tras una purga el CDN vuelve a pedir las páginas a cualquier instancia de
+la API, y las que no hicieron la escritura pueden tener todavía la
+instantánea anterior del catálogo (el admin es otra función y solo
+descarta la suya). El retraso está acotado:
+- las respuestas servidas desde una instantánea caducada (modo swr) no
+  llevan s-maxage, así que el CDN no las guarda;
+- una instantánea vigente tiene como mucho CATALOG_CACHE_TTL segundos, así
+  que un cambio del admin llega a todas las respuestas del CDN en, como
+  mucho, CATALOG_CACHE_TTL más el s-maxage de la ruta.
+"""
+
+import logging
+import os
+import threading
+from functools import wraps
+
+import httpx
+from flask import make_response
+
+from repository import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+CDN_PURGE_URL = os.environ.get('CDN_PURGE_URL', '')
+CDN_PURGE_TOKEN = os.environ.get('CDN_PURGE_TOKEN', '')
+CDN_TAG_HEADER = os.environ.get('CDN_TAG_HEADER', 'Vercel-Cache-Tag')
+
+CATALOG_KEY = 'catalog'
+
+# Políticas por tipo de ruta: (s-maxage, stale-while-revalidate) en segundos
+LISTING_POLICY = (60, 600)
+PRODUCT_POLICY = (300, 3600)
+
+
+def product_key(product_id):
+    return f'product-{product_id}'
+
+
+def cache_policy(policy, keys):
+    """
+    Decorador: Cache-Control para el CDN y etiquetas de purga en respuestas 200/304.
+
+    Args:
+        policy: Tupla (s_maxage, stale_while_revalidate)
+        keys: Lista de etiquetas, o función (respuesta, **view_args) -> lista.
+              Si la función devuelve None la respuesta no se cachea.
+    """
+    s_maxage, stale_while_revalidate = policy
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+
+            tags = keys(response, **kwargs) if callable(keys) else keys
+            if tags is None or catalog_cache.is_stale():
+                return response
+
+            response.headers['Cache-Control'] = (
+                f'public, max-age=0, s-maxage={s_maxage}, '
+                f'stale-while-revalidate={stale_while_revalidate}'
+            )
+            if tags:
+                response.headers[CDN_TAG_HEADER] = ','.join(tags)
+            return response
+        return wrapper
+    return decorator
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def _client():
+    global _http_client
+
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = httpx.Client(timeout=3)
+    return _http_client
+
+
+def purge(keys):
+    """Pide al CDN que invalide las respuestas con estas etiquetas (nunca lanza)"""
+    if not CDN_PURGE_URL or not keys:
+        return False
+
+    headers = {'Authorization': f'Bearer {CDN_PURGE_TOKEN}'} if CDN_PURGE_TOKEN else {}
+    try:
+        response = _client().post(CDN_PURGE_URL, json={'tags': list(keys)}, headers=headers)
+        response.raise_for_status()
+        return True
+    except Exception as e:
+        logger.warning(f"Purga del CDN fallida para {keys}: {e}")
+        return False
+
+
+def purge_product(product_id=None):
+    """
+    Purga los listados del catálogo y, si se indica, la ficha de un producto.
+
+    La instantánea local del catálogo se descarta antes, para que esta
+    instancia no devuelva al CDN los datos anteriores a la escritura.
+
+    Returns:
+        True si el CDN aceptó la purga
+    """
+    catalog_cache.invalidate()
+
+    keys = [CATALOG_KEY]
+    if product_id is not None:
+        keys.append(product_key(product_id))
+    return purge(keys)
@@ -0,0 +1,104 @@
+"""
+Compresión de respuestas (gzip / brotli) para la API y el panel de admin.
+
+Se negocia con Accept-Encoding y solo se comprimen respuestas JSON/HTML
+por encima de COMPRESS_MIN_SIZE bytes. Las respuestas con ETag (el
+catálogo) se comprimen una sola vez con un nivel alto y se reutilizan
+desde una pequeña caché LRU mientras no cambie la ETag.
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_CACHE_SIZE = int(os.environ.get('COMPRESS_CACHE_SIZE', '128'))
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'application/javascript',
+}
+
+# Sufijos que se añaden a la ETag de cada representación comprimida
+ETAG_SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _compress(data, encoding, cacheable):
+    # Lo que se cachea se comprime una vez con más nivel; lo dinámico, rápido
+    if encoding == 'br':
+        return brotli.compress(data, quality=9 if cacheable else 4)
+    return gzip.compress(data, compresslevel=9 if cacheable else 6)
+
+
+def _compressed(data, encoding, etag):
+    if not etag:
+        return _compress(data, encoding, cacheable=False)
+
+    key = (etag, encoding)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    body = _compress(data, encoding, cacheable=True)
+    with _cache_lock:
+        _cache[key] = body
+        while len(_cache) > COMPRESS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return body
+
+
+def _negotiate():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response):
+    """after_request: comprime la respuesta si el cliente lo acepta y merece la pena"""
+    if response.status_code == 304:
+        # La variante que se valida depende de Accept-Encoding (ETag con sufijo)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.status_code == 204
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    etag, weak = response.get_etag()
+    response.set_data(_compressed(data, encoding, etag if etag and not weak else None))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(etag + ETAG_SUFFIXES[encoding], weak=weak)
+    return response
+
+
+def init_compression(app):
+    """Registra la compresión de respuestas en una app Flask"""
+    app.after_request(compress_response)
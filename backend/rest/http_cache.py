@@ -0,0 +1,50 @@
+"""
+GET condicionales (ETag / If-None-Match) para los endpoints del catálogo.
+
+La ETag se deriva de la versión de la caché del catálogo y de la URL
+pedida, así que se puede comprobar If-None-Match y responder 304 antes
+de ejecutar la vista, sin tocar Supabase.
+"""
+
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+from repository import catalog_cache
+from rest.compression import ETAG_SUFFIXES
+
+
+def _catalog_etag(version):
+    raw = f"{version}|{request.full_path}".encode()
+    return hashlib.sha1(raw).hexdigest()[:20]
+
+
+def _client_etag(etag):
+    """La variante de la ETag que tiene el cliente (sin comprimir, -gzip o -br), o None"""
+    for suffix in ('',) + tuple(ETAG_SUFFIXES.values()):
+        if request.if_none_match.contains(etag + suffix):
+            return etag + suffix
+    return None
+
+
+def catalog_etag(view):
+    """Decorador: ETag fuerte por versión del catálogo y 304 si el cliente ya la tiene"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        before = catalog_cache.version()
+        if before is not None:
+            matched = _client_etag(_catalog_etag(before))
+            if matched:
+                response = make_response('', 304)
+                response.set_etag(matched)
+                return response
+
+        response = make_response(view(*args, **kwargs))
+
+        # Solo se etiqueta si la respuesta sale de una única versión del catálogo
+        after = catalog_cache.version()
+        if response.status_code == 200 and after is not None and before in (None, after):
+            response.set_etag(_catalog_etag(after))
+        return response
+    return wrapper
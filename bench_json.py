@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark de serialización JSON: proveedor por defecto de Flask vs orjson
+Usa cargas sintéticas con la forma del catálogo completo y de todos los pedidos
+Ejecutar: python bench_json.py
+"""
+
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+# Añadir el directorio backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from rest.json_provider import FastJSONProvider, orjson
+
+ROUNDS = 20
+
+
+def build_catalog(n=300):
+    now = datetime.now(timezone.utc)
+    return [{
+        'id': i,
+        'name': f'Café de especialidad {i}',
+        'slug': f'cafe-{i}',
+        'description': 'Notas de chocolate, frutos rojos y panela. ' * 8,
+        'origin': 'Etiopía',
+        'roast': 'medio',
+        'process': 'lavado',
+        'flavor_notes': ['chocolate', 'frutos rojos', 'panela'],
+        'price': Decimal('14.50') + i,
+        'stock': 40,
+        'featured': i % 5 == 0,
+        'is_new': i % 7 == 0,
+        'created_at': now - timedelta(days=i),
+    } for i in range(n)]
+
+
+def build_orders(n=5000):
+    now = datetime.now(timezone.utc)
+    return [{
+        'id': i,
+        'user_id': uuid.uuid4(),
+        'status': 'pending',
+        'total': Decimal('42.30'),
+        'created_at': now - timedelta(hours=i),
+        'shipping_address': {'street': 'Calle Mayor 1', 'city': 'Madrid', 'zip': '28001', 'country': 'ES'},
+        'profiles': {'id': uuid.uuid4(), 'email': f'cliente{i}@example.com', 'full_name': 'Cliente', 'phone': None},
+        'items': [{
+            'id': i * 10 + j,
+            'product_id': j,
+            'quantity': 2,
+            'price': Decimal('14.10'),
+            'products': {'id': j, 'name': f'Café {j}', 'image': None, 'slug': f'cafe-{j}'},
+        } for j in range(3)],
+    } for i in range(n)]
+
+
+def bench(provider_class, payload):
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    with app.app_context():
+        app.json.response(payload)  # calentamiento
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            app.json.response(payload)
+        return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    if orjson is None:
+        print("❌ orjson no está instalado: pip install orjson")
+        sys.exit(1)
+
+    payloads = {
+        'catálogo completo (300 productos)': build_catalog(),
+        'todos los pedidos (5000 con items)': build_orders(),
+    }
+
+    print("⏱️  Serialización JSON por respuesta (media de %d rondas)\n" % ROUNDS)
+    for name, payload in payloads.items():
+        default_ms = bench(DefaultJSONProvider, payload)
+        fast_ms = bench(FastJSONProvider, payload)
+        print(f"   {name}")
+        print(f"      Flask por defecto: {default_ms:8.2f} ms")
+        print(f"      orjson:            {fast_ms:8.2f} ms  ({default_ms / fast_ms:.1f}x, "
+              f"{default_ms - fast_ms:.2f} ms ahorrados)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Script para reconstruir los agregados de rating de los productos
+(rating, rating_sum, reviews_count) a partir de product_reviews
+Ejecutar: python rebuild_ratings.py
+"""
+
+import sys
+import os
+
+# Añadir el directorio backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import repository.store_repo as store_repo
+
+def main():
+    print("⭐ Reconstruyendo ratings de productos...")
+    
+    try:
+        updated = store_repo.rebuildProductRatings()
+        print(f"✅ {updated} productos actualizados")
+    except Exception as e:
+        print("\n❌ Error al reconstruir los ratings:")
+        print(f"   {str(e)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Fixtures comunes de los tests.
+
+Los tests de SQL directo necesitan un PostgreSQL local: se usa el de
+TEST_DATABASE_URL si está definida y, si no, se arranca uno temporal con
+pgserver (pip install -r requirements-dev.txt). Si no hay ninguno, esos
+tests se saltan.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Agregar el directorio backend al path
+BACKEND_DIR = Path(__file__).resolve().parents[1] / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Los módulos del backend leen la configuración al importarse
+os.environ.setdefault('SUPABASE_URL', 'http://supabase.test')
+os.environ.setdefault('SUPABASE_ANON_KEY', 'test-anon-key')
+os.environ.setdefault('SUPABASE_SERVICE_KEY', 'test-service-key')
+
+SCHEMA_SQL = '''
+    CREATE TABLE profiles (
+        id UUID PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        email TEXT,
+        full_name TEXT,
+        phone TEXT,
+        role TEXT DEFAULT 'customer'
+    );
+    CREATE TABLE products (
+        id SERIAL PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL,
+        name TEXT,
+        slug TEXT UNIQUE,
+        description TEXT,
+        origin TEXT,
+        roast TEXT,
+        process TEXT,
+        flavor_notes TEXT[],
+        category TEXT,
+        price NUMERIC,
+        image TEXT,
+        featured BOOLEAN,
+        is_new BOOLEAN,
+        is_active BOOLEAN,
+        rating INTEGER,
+        rating_sum INTEGER,
+        reviews_count INTEGER
+    );
+    CREATE TABLE orders (
+        id SERIAL PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL,
+        user_id UUID REFERENCES profiles (id),
+        status TEXT,
+        total NUMERIC,
+        shipping_address JSONB,
+        payment_intent TEXT
+    );
+    CREATE TABLE order_items (
+        id SERIAL PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        order_id INTEGER REFERENCES orders (id) ON DELETE CASCADE,
+        product_id INTEGER REFERENCES products (id),
+        quantity INTEGER,
+        price NUMERIC
+    );
+'''
+
+
+def _seed(cur):
+    cur.execute(
+        "INSERT INTO profiles (id, email, full_name, phone) VALUES "
+        "('6f1b6f9e-3c1e-4a3e-9a55-1f9b8c2f0a11', 'ana@example.com', 'Ana', '600000001'), "
+        "('0c9e2d3a-7b41-4c5e-8f0a-2d6b9e1c4f22', 'luis@example.com', 'Luis', NULL)"
+    )
+
+    origins = ['Etiopía', 'Colombia', 'Kenia', 'Brasil']
+    roasts = ['claro', 'medio', 'oscuro']
+    for i in range(1, 15):
+        cur.execute(
+            "INSERT INTO products (created_at, name, slug, description, origin, roast, process, "
+            " flavor_notes, category, price, image, featured, is_new, is_active, rating, rating_sum, reviews_count) "
+            "VALUES (timestamptz '2025-01-01 00:00:00+00' + %s * interval '1 day', %s, %s, %s, %s, %s, %s, "
+            " %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (
+                i, f'Café {origins[i % 4]} {i}', f'cafe-{i}', 'Notas de chocolate y panela',
+                origins[i % 4], roasts[i % 3], 'lavado' if i % 2 else 'natural',
+                ['chocolate', 'panela'], 'coffee' if i < 11 else 'accesorios',
+                None if i == 5 else 10 + i * 2.5, f'/img/{i}.jpg',
+                i % 3 == 0, i % 4 == 0, i != 7, i % 5, (i % 5) * 2, 2,
+            )
+        )
+
+    users = ['6f1b6f9e-3c1e-4a3e-9a55-1f9b8c2f0a11', '0c9e2d3a-7b41-4c5e-8f0a-2d6b9e1c4f22', None]
+    statuses = ['pending', 'completed', 'cancelled', 'processing']
+    for i in range(1, 10):
+        cur.execute(
+            "INSERT INTO orders (created_at, user_id, status, total, shipping_address) "
+            "VALUES (date_trunc('hour', now()) - %s * interval '20 hours', %s, %s, %s, %s) RETURNING id",
+            (i, users[i % 3], statuses[i % 4], 12.5 * i, '{"city": "Madrid"}')
+        )
+        order_id = cur.fetchone()[0]
+        for j in range(1 + i % 3):
+            cur.execute(
+                "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+                (order_id, 1 + (i + j) % 14, 1 + j, 12.5)
+            )
+
+
+@pytest.fixture(scope='session')
+def pg_url():
+    """URL de un PostgreSQL local con el esquema y los datos de prueba"""
+    psycopg2 = pytest.importorskip('psycopg2')
+
+    url = os.environ.get('TEST_DATABASE_URL')
+    server = None
+    if not url:
+        pgserver = pytest.importorskip('pgserver', reason="sin TEST_DATABASE_URL ni pgserver")
+        server = pgserver.get_server(tempfile.mkdtemp(prefix='onsen-pg-'), cleanup_mode='stop')
+        url = server.get_uri()
+
+    conn = psycopg2.connect(url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SET TIME ZONE 'UTC'")
+        cur.execute("DROP TABLE IF EXISTS order_items, orders, products, profiles CASCADE")
+        cur.execute(SCHEMA_SQL)
+        cur.execute('ALTER DATABASE "%s" SET timezone TO \'UTC\'' % conn.info.dbname)
+        _seed(cur)
+    conn.close()
+
+    yield url
+
+    if server is not None:
+        server.cleanup()
@@ -0,0 +1,170 @@
+"""
+Sustituto local de PostgREST para los tests.
+
+Traduce las peticiones GET que genera postgrest-py (select con embeds,
+filtros eq/neq/gt/gte/lt/lte/in/is, or=(...) con and(...) anidados,
+order, limit y offset) a SQL sobre el PostgreSQL de prueba, y devuelve
+las filas con to_jsonb, como PostgREST. Así el camino PostgREST del
+repositorio se puede comparar con el de SQL directo sobre los mismos datos.
+"""
+
+import re
+
+import httpx
+from postgrest import SyncPostgrestClient
+
+# Embeds conocidos: (tabla, nombre del embed) -> (tabla embebida, columna FK)
+EMBEDS = {
+    ('orders', 'profiles'): ('profiles', 'user_id'),
+    ('orders', 'user_id'): ('profiles', 'user_id'),
+    ('order_items', 'products'): ('products', 'product_id'),
+}
+
+OPERATORS = {'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+_IDENT_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def _ident(name):
+    if not _IDENT_RE.match(name):
+        raise ValueError(f"Identificador no válido: {name}")
+    return name
+
+
+def _split(text):
+    """Divide por comas de primer nivel (respetando paréntesis y comillas)"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _unquote(value):
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _condition(column, expression, params):
+    """SQL de un filtro 'op.valor' sobre una columna"""
+    column = f't.{_ident(column)}'
+    operator, _, value = expression.partition('.')
+    if operator == 'in':
+        values = [_unquote(v) for v in _split(value.strip('()'))]
+        params.extend(values)
+        return f"{column} IN ({', '.join(['%s'] * len(values))})"
+    if operator == 'is':
+        return f"{column} IS {'NULL' if value == 'null' else value.upper()}"
+    params.append(_unquote(value))
+    return f"{column} {OPERATORS[operator]} %s"
+
+
+def _logical(expression, params, joiner):
+    """SQL de or=(...) / and(...): condiciones separadas por comas, anidables"""
+    conditions = []
+    for part in _split(expression.strip('()')):
+        if part.startswith(('and(', 'or(')):
+            name, _, rest = part.partition('(')
+            conditions.append(_logical('(' + rest, params, ' AND ' if name == 'and' else ' OR '))
+        else:
+            column, _, filter_expression = part.partition('.')
+            conditions.append(_condition(column, filter_expression, params))
+    return '(' + joiner.join(conditions) + ')'
+
+
+def _projection(table, select):
+    """Expresión jsonb de cada fila a partir del parámetro select"""
+    columns, embeds = [], []
+    for item in _split(select or '*'):
+        if '(' in item:
+            name, _, inner = item.partition('(')
+            alias, _, hint = name.partition(':')
+            embedded, fk = EMBEDS[(table, hint or alias)]
+            inner_columns = [_ident(c) for c in _split(inner.rstrip(')'))]
+            pairs = ', '.join(f"'{c}', e.{c}" for c in inner_columns)
+            embeds.append(
+                f"jsonb_build_object('{_ident(alias)}', "
+                f"(SELECT jsonb_build_object({pairs}) FROM {_ident(embedded)} e WHERE e.id = t.{_ident(fk)}))"
+            )
+        else:
+            columns.append(item)
+
+    if columns == ['*']:
+        base = 'to_jsonb(t)'
+    else:
+        base = 'jsonb_build_object(' + ', '.join(f"'{_ident(c)}', t.{_ident(c)}" for c in columns) + ')'
+    return ' || '.join([base] + embeds)
+
+
+def build_sql(table, query_params):
+    """(sql, params) equivalentes a una petición GET de PostgREST"""
+    params, where = [], []
+    select = order = limit = offset = None
+    for name, value in query_params:
+        if name == 'select':
+            select = value
+        elif name == 'order':
+            order = value
+        elif name == 'limit':
+            limit = int(value)
+        elif name == 'offset':
+            offset = int(value)
+        elif name in ('or', 'and'):
+            where.append(_logical(value, params, ' OR ' if name == 'or' else ' AND '))
+        else:
+            where.append(_condition(name, value, params))
+
+    sql = f"SELECT {_projection(table, select)} FROM {_ident(table)} t"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    if order:
+        terms = []
+        for term in order.split(','):
+            column, _, direction = term.partition('.')
+            direction = direction.split('.')[0] if direction else 'asc'
+            terms.append(f"t.{_ident(column)} {'DESC' if direction == 'desc' else 'ASC'}")
+        sql += ' ORDER BY ' + ', '.join(terms)
+    if limit is not None:
+        sql += f' LIMIT {limit}'
+    if offset is not None:
+        sql += f' OFFSET {offset}'
+    return sql, params
+
+
+class PostgrestStub:
+    """Cliente con la interfaz table() del de Supabase, servido por el PostgreSQL de prueba"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.requests = []
+        transport = httpx.MockTransport(self._handle)
+        self._client = SyncPostgrestClient(
+            'http://postgrest.test',
+            http_client=httpx.Client(transport=transport, base_url='http://postgrest.test')
+        )
+
+    def _handle(self, request):
+        if request.method != 'GET':
+            return httpx.Response(405, json={'message': 'Solo GET en el sustituto de PostgREST'})
+        table = request.url.path.rstrip('/').rsplit('/', 1)[-1]
+        query_params = list(request.url.params.multi_items())
+        self.requests.append((table, query_params))
+
+        sql, params = build_sql(table, query_params)
+        with self.connection.cursor() as cur:
+            cur.execute(sql, params)
+            rows = [row[0] for row in cur.fetchall()]
+        return httpx.Response(200, json=rows)
+
+    def table(self, name):
+        return self._client.from_(name)
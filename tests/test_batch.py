@@ -0,0 +1,79 @@
+"""
+POST /api/batch: aislamiento entre lotes y cookies de las subpeticiones.
+"""
+
+import threading
+
+import pytest
+
+from repository import store_repo
+from rest import app_rest, cart_store
+
+PRODUCTS = {
+    '1': {'id': 1, 'name': 'Etiopía', 'price': 12.5, 'origin': 'Etiopía'},
+    '2': {'id': 2, 'name': 'Kenia', 'price': 14.0, 'origin': 'Kenia'},
+}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(cart_store, 'CART_STORE', 'memory')
+    monkeypatch.setattr(cart_store, '_store', cart_store.MemoryCartStore())
+    monkeypatch.setattr(
+        store_repo, 'obtainCoffeesByIds',
+        lambda ids, fields=None: [PRODUCTS[str(i)] for i in ids if str(i) in PRODUCTS]
+    )
+
+    from main import create_app
+    return create_app()
+
+
+def test_sub_response_cookies_reach_the_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['cart'] = [{'coffeeId': 1, 'quantity': 2}, {'coffeeId': 2, 'quantity': 1}]
+
+    response = client.post('/api/batch', json={'requests': ['/api/cart', '/api/']})
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['responses']] == [200, 200]
+
+    set_cookies = response.headers.getlist('Set-Cookie')
+    assert sum(header.startswith(cart_store.CART_COOKIE + '=') for header in set_cookies) == 1
+
+    # Con la cookie recibida, el carrito migrado sigue ahí en la siguiente petición
+    cart = client.get('/api/cart').get_json()
+    assert {(item['id'], item['quantity']) for item in cart} == {(1, 2), (2, 1)}
+
+
+def test_slow_batch_does_not_block_other_batches(app):
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def slow():
+        started.release()
+        release.wait(5)
+        return {'slow': True}
+
+    app.add_url_rule('/api/slow', 'slow', slow)
+    slow_paths = ['/api/slow'] * app_rest.BATCH_WORKERS
+
+    slow_batch = threading.Thread(
+        target=lambda: app.test_client().post('/api/batch', json={'requests': slow_paths})
+    )
+    slow_batch.start()
+    try:
+        for _ in slow_paths:
+            assert started.acquire(timeout=5)
+
+        # Todas las subpeticiones lentas están en curso; otro lote no espera por ellas
+        result = {}
+        fast_batch = threading.Thread(
+            target=lambda: result.update(app.test_client().post('/api/batch', json={'requests': ['/api/']}).get_json())
+        )
+        fast_batch.start()
+        fast_batch.join(2)
+        assert not fast_batch.is_alive()
+        assert result['responses'][0]['status'] == 200
+    finally:
+        release.set()
+        slow_batch.join(5)
@@ -0,0 +1,179 @@
+"""
+Almacenes del carrito: el mismo comportamiento en memoria, SQLite y Redis.
+
+Redis se sustituye por un cliente en memoria con los comandos que usa
+RedisCartStore (hashes, expire y pipeline).
+"""
+
+import time
+
+import pytest
+
+from rest import cart_store
+
+CART = 'AAAAAAAAAAAAAAAA'
+OTHER_CART = 'BBBBBBBBBBBBBBBB'
+
+
+class FakeRedis:
+    """Cliente Redis mínimo: hashes con caducidad por clave"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.expires = {}
+
+    def _hash(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.delete(key)
+        return self.hashes.setdefault(key, {})
+
+    def hgetall(self, key):
+        return {field: str(value) for field, value in self._hash(key).items()}
+
+    def hincrby(self, key, field, amount):
+        items = self._hash(key)
+        items[field] = int(items.get(field, 0)) + amount
+        return items[field]
+
+    def hexists(self, key, field):
+        return field in self._hash(key)
+
+    def hset(self, key, field, value):
+        self._hash(key)[field] = value
+
+    def hdel(self, key, field):
+        self._hash(key).pop(field, None)
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+        self.expires.pop(key, None)
+
+    def expire(self, key, seconds):
+        self.expires[key] = time.monotonic() + seconds
+
+    def ttl(self, key):
+        return self.expires[key] - time.monotonic()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((getattr(self.client, name), args))
+
+    def execute(self):
+        return [command(*args) for command, args in self.commands]
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return cart_store.MemoryCartStore()
+    if request.param == 'sqlite':
+        return cart_store.SQLiteCartStore(path=str(tmp_path / 'carts.sqlite3'))
+    return cart_store.RedisCartStore(client=FakeRedis())
+
+
+def test_add_accumulates_quantities(store):
+    store.add(CART, '1', 2)
+    store.add(CART, '1', 3)
+    store.add(CART, '2', 1)
+    assert store.get(CART) == {'1': 5, '2': 1}
+    assert store.get(OTHER_CART) == {}
+
+
+def test_update_only_changes_existing_items(store):
+    store.add(CART, '1', 2)
+    store.update(CART, '1', 7)
+    store.update(CART, '3', 4)
+    assert store.get(CART) == {'1': 7}
+
+
+def test_remove_and_clear(store):
+    store.add(CART, '1', 1)
+    store.add(CART, '2', 1)
+    store.add(OTHER_CART, '1', 1)
+
+    store.remove(CART, '1')
+    assert store.get(CART) == {'2': 1}
+
+    store.clear(CART)
+    assert store.get(CART) == {}
+    assert store.get(OTHER_CART) == {'1': 1}
+
+
+def test_redis_remove_refreshes_ttl():
+    client = FakeRedis()
+    store = cart_store.RedisCartStore(client=client, ttl=3600)
+    store.add(CART, '1', 1)
+    store.add(CART, '2', 1)
+    client.expire(f'cart:{CART}', 5)
+
+    store.remove(CART, '1')
+
+    assert client.ttl(f'cart:{CART}') > 3500
+    assert store.get(CART) == {'2': 1}
+
+
+def test_memory_store_sweeps_abandoned_carts(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cart_store.time, 'monotonic', lambda: now[0])
+    store = cart_store.MemoryCartStore(ttl=60)
+
+    store.add(CART, '1', 1)
+    now[0] += 61
+    store.add(OTHER_CART, '1', 1)
+
+    # El carrito abandonado se descarta aunque nadie vuelva a pedirlo
+    assert list(store._carts) == [OTHER_CART]
+
+
+def test_memory_store_is_bounded_lru():
+    store = cart_store.MemoryCartStore(max_carts=2)
+    store.add('cart-a', '1', 1)
+    store.add('cart-b', '1', 1)
+    store.get('cart-a')
+    store.add('cart-c', '1', 1)
+
+    assert store.get('cart-b') == {}
+    assert store.get('cart-a') == {'1': 1}
+    assert store.get('cart-c') == {'1': 1}
+
+
+def test_redis_without_url_falls_back_to_session(monkeypatch):
+    monkeypatch.setattr(cart_store, 'CART_STORE', 'redis')
+    monkeypatch.setattr(cart_store, 'CART_STORE_URL', '')
+    monkeypatch.setattr(cart_store, '_store', None)
+
+    assert isinstance(cart_store.get_store(), cart_store.SessionCartStore)
+
+
+def test_cart_endpoints_keep_the_cart_server_side(monkeypatch, tmp_path):
+    from repository import store_repo
+
+    monkeypatch.setattr(cart_store, 'CART_STORE', 'sqlite')
+    monkeypatch.setattr(cart_store, '_store', cart_store.SQLiteCartStore(path=str(tmp_path / 'carts.sqlite3')))
+    monkeypatch.setattr(
+        store_repo, 'obtainCoffeesByIds',
+        lambda ids, fields=None: [{'id': int(i), 'name': f'Café {i}', 'price': 10} for i in ids]
+    )
+
+    from main import create_app
+    client = create_app().test_client()
+
+    response = client.post('/api/cart', json={'coffeeId': 3, 'quantity': 2})
+    assert response.status_code == 200
+    cart_id = client.get_cookie(cart_store.CART_COOKIE).value
+
+    client.put('/api/cart/3', json={'quantity': 5})
+    assert [(item['id'], item['quantity']) for item in client.get('/api/cart').get_json()] == [(3, 5)]
+    assert cart_store.get_store().get(cart_id) == {'3': 5}
+
+    client.delete('/api/cart/3')
+    assert client.get('/api/cart').get_json() == []
@@ -0,0 +1,123 @@
+"""
+Versión de la caché del catálogo (base de las ETags de la tienda).
+"""
+
+import pytest
+
+from repository import catalog_cache
+
+PRODUCTS = [
+    {'id': 1, 'slug': 'etiopia', 'name': 'Etiopía', 'price': 12.5, 'updated_at': '2025-01-01T00:00:00+00:00'},
+    {'id': 2, 'slug': 'kenia', 'name': 'Kenia', 'price': 14.0, 'updated_at': '2025-01-02T00:00:00+00:00'},
+]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    catalog_cache.invalidate()
+    yield
+    catalog_cache.invalidate()
+
+
+def test_version_is_none_without_snapshot():
+    assert catalog_cache.version() is None
+
+
+def test_version_is_the_same_across_instances_with_the_same_catalog():
+    catalog_cache.get_snapshot(lambda: [dict(p) for p in PRODUCTS])
+    first = catalog_cache.version()
+
+    # Otra instancia: mismo contenido, cargado en otro orden y en otro momento
+    catalog_cache.invalidate()
+    catalog_cache.get_snapshot(lambda: [dict(p) for p in reversed(PRODUCTS)])
+
+    assert first is not None
+    assert catalog_cache.version() == first
+
+
+def test_version_changes_with_the_content():
+    catalog_cache.get_snapshot(lambda: [dict(p) for p in PRODUCTS])
+    before = catalog_cache.version()
+
+    catalog_cache.invalidate()
+    catalog_cache.get_snapshot(lambda: [dict(PRODUCTS[0], price=13.0), dict(PRODUCTS[1])])
+
+    assert catalog_cache.version() != before
+
+
+def test_same_version_means_same_responses(monkeypatch):
+    from repository import store_repo
+
+    products = [
+        {'id': 1, 'category': 'coffee', 'rating': 4, 'reviews_count': 2, 'created_at': '2025-01-01'},
+        {'id': 2, 'category': 'accesorios', 'rating': 4, 'reviews_count': 2, 'created_at': '2025-01-01'},
+    ]
+    responses = []
+    for order in (products, list(reversed(products))):
+        catalog_cache.invalidate()
+        monkeypatch.setattr(store_repo, '_fetchActiveProducts', lambda order=order: [dict(p) for p in order])
+        coffees, home = store_repo.obtainCoffees(), store_repo.getHomeCatalog()
+        responses.append((catalog_cache.version(), coffees, home))
+
+    assert responses[0] == responses[1]
+    assert [p['id'] for p in responses[0][1]] == [1, 2]
+    assert [c['category'] for c in responses[0][2]['categories']] == ['accesorios', 'coffee']
+    assert [p['id'] for p in responses[0][2]['top_rated']] == [1, 2]
+
+
+def test_read_after_invalidate_does_not_join_an_older_load():
+    import threading
+
+    started, release = threading.Event(), threading.Event()
+    price = [10]
+
+    def slow_loader():
+        loaded = [{'id': 1, 'price': price[0]}]
+        started.set()
+        release.wait(5)
+        return loaded
+
+    first = threading.Thread(target=catalog_cache.get_snapshot, args=(slow_loader,))
+    first.start()
+    try:
+        assert started.wait(5)
+        # Escritura mientras la primera carga está en curso
+        price[0] = 20
+        catalog_cache.invalidate()
+
+        snapshot = catalog_cache.get_snapshot(lambda: [{'id': 1, 'price': price[0]}])
+        assert snapshot.by_id['1']['price'] == 20
+    finally:
+        release.set()
+        first.join(5)
+
+    # La carga antigua no se publica al terminar
+    assert catalog_cache.get_snapshot(slow_loader).by_id['1']['price'] == 20
+
+
+@pytest.fixture
+def serverless_swr(monkeypatch):
+    monkeypatch.setattr(catalog_cache, 'CATALOG_CACHE_MODE', 'swr')
+    monkeypatch.setattr(catalog_cache, 'REFRESH_INLINE', True)
+    monkeypatch.setattr(catalog_cache, '_refresh_failed_at', None)
+    catalog_cache.get_snapshot(lambda: [{'id': 1, 'price': 10}])
+    # Caducada, pero dentro del margen de swr
+    catalog_cache._snapshot.loaded_at -= catalog_cache.CATALOG_CACHE_TTL + 1
+
+
+def test_serverless_swr_refreshes_inline(serverless_swr):
+    snapshot = catalog_cache.get_snapshot(lambda: [{'id': 1, 'price': 20}])
+
+    assert snapshot.by_id['1']['price'] == 20
+    assert snapshot.is_fresh()
+    assert not catalog_cache.stats()['refreshing']
+
+
+def test_serverless_swr_serves_stale_when_refresh_fails(serverless_swr):
+    def failing_loader():
+        raise RuntimeError("Supabase no responde")
+
+    snapshot = catalog_cache.get_snapshot(failing_loader)
+
+    assert snapshot.by_id['1']['price'] == 10
+    assert catalog_cache.stats()['last_refresh_failed']
@@ -0,0 +1,98 @@
+"""
+Purga del CDN tras escribir productos desde el admin (dentro de la petición).
+
+El CDN se sustituye por un transporte httpx local que anota las etiquetas
+purgadas en cada petición.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import httpx
+import pytest
+
+from repository import catalog_cache, store_repo
+from rest import cdn
+
+ADMIN_APP = Path(__file__).resolve().parents[1] / 'admin' / 'app.py'
+
+
+class PurgeStub:
+    """Endpoint de purga local: guarda las etiquetas de cada petición"""
+
+    def __init__(self):
+        self.purged = []
+        self.client = httpx.Client(transport=httpx.MockTransport(self._handle))
+
+    def _handle(self, request):
+        assert request.headers['Authorization'] == 'Bearer test-token'
+        self.purged.append(httpx.Response(200, content=request.content).json()['tags'])
+        return httpx.Response(200, json={'ok': True})
+
+
+@pytest.fixture
+def purges(monkeypatch):
+    stub = PurgeStub()
+    monkeypatch.setattr(cdn, 'CDN_PURGE_URL', 'http://cdn.test/purge')
+    monkeypatch.setattr(cdn, 'CDN_PURGE_TOKEN', 'test-token')
+    monkeypatch.setattr(cdn, '_http_client', stub.client)
+    return stub
+
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    monkeypatch.setattr(store_repo, 'updateCoffee', lambda data: {"status": "ok"})
+    monkeypatch.setattr(store_repo, 'deleteCoffee', lambda coffee_id: {"status": "ok"})
+
+    spec = importlib.util.spec_from_file_location('admin_app', ADMIN_APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app.test_client()
+
+
+def test_product_update_purges_catalog_and_product(admin_client, purges):
+    response = admin_client.post('/admin/update-coffee/7', data={'name': 'Kenia AA'})
+
+    assert response.status_code == 200
+    assert purges.purged == [['catalog', 'product-7']]
+
+
+def test_product_delete_purges_catalog_and_product(admin_client, purges):
+    response = admin_client.delete('/admin/api/coffees/3')
+
+    assert response.status_code == 200
+    assert purges.purged == [['catalog', 'product-3']]
+
+
+def test_purge_invalidates_local_catalog_first(purges):
+    catalog_cache.get_snapshot(lambda: [{'id': 1, 'slug': 'etiopia'}])
+    assert catalog_cache.version() is not None
+
+    cdn.purge_product(1)
+
+    assert catalog_cache.version() is None
+
+
+def test_purge_does_nothing_without_url(monkeypatch):
+    monkeypatch.setattr(cdn, 'CDN_PURGE_URL', '')
+    assert cdn.purge_product(1) is False
+
+
+def test_stale_catalog_responses_are_not_cached_by_the_cdn(monkeypatch):
+    from flask import Flask
+
+    app = Flask(__name__)
+
+    @app.route('/listing')
+    @cdn.cache_policy(cdn.LISTING_POLICY, [cdn.CATALOG_KEY])
+    def listing():
+        return {'ok': True}
+
+    client = app.test_client()
+    monkeypatch.setattr(catalog_cache, 'is_stale', lambda: False)
+    assert 's-maxage' in client.get('/listing').headers['Cache-Control']
+
+    monkeypatch.setattr(catalog_cache, 'is_stale', lambda: True)
+    response = client.get('/listing')
+    assert 'Cache-Control' not in response.headers
+    assert cdn.CDN_TAG_HEADER not in response.headers
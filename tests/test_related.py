@@ -0,0 +1,91 @@
+"""
+Productos relacionados: mismo resultado con y sin NumPy, y cálculo fuera
+del cerrojo de la caché del catálogo.
+"""
+
+import random
+
+import pytest
+
+from repository import catalog_cache, related
+
+ORIGINS = ['Etiopía', 'Colombia', 'Kenia']
+ROASTS = ['claro', 'medio']
+
+
+def _catalog(count=60):
+    # Pocos valores distintos: muchos productos idénticos y muchos empates
+    return [
+        {
+            'id': i,
+            'origin': ORIGINS[i % 3],
+            'roast': ROASTS[i % 2],
+            'category': 'coffee',
+            'flavor_notes': ['chocolate'] if i % 4 else ['cítricos'],
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+@pytest.fixture
+def python_only(monkeypatch):
+    monkeypatch.setattr(related, 'np', None)
+
+
+def test_numpy_and_python_agree_on_ties(monkeypatch):
+    pytest.importorskip('numpy')
+    products = _catalog()
+    with_numpy = related.compute(products)
+
+    monkeypatch.setattr(related, 'np', None)
+    assert related.compute(products) == with_numpy
+
+
+def test_ties_are_broken_by_id(python_only):
+    neighbours = related.compute(_catalog())['1']
+    assert len(neighbours) == related.RELATED_TOP_K
+    for (first_id, first_score), (second_id, second_score) in zip(neighbours, neighbours[1:]):
+        assert (-first_score, first_id) < (-second_score, second_id)
+
+
+def test_result_does_not_depend_on_load_order():
+    products = _catalog()
+    shuffled = list(products)
+    random.Random(7).shuffle(shuffled)
+    assert related.compute(shuffled) == related.compute(products)
+
+
+def test_neighbours_are_computed_outside_the_catalog_lock(monkeypatch):
+    calls = []
+
+    def prepare(products):
+        calls.append(('prepare', catalog_cache._lock.locked()))
+        return len(products)
+
+    def publish(count):
+        calls.append(('publish', catalog_cache._lock.locked(), count))
+
+    monkeypatch.setattr(catalog_cache, '_listeners', [(publish, prepare)])
+    catalog_cache.invalidate()
+    try:
+        catalog_cache.get_snapshot(lambda: _catalog(5))
+    finally:
+        catalog_cache.invalidate()
+
+    assert calls == [('prepare', False), ('publish', True, 5)]
+
+
+def test_discarded_load_is_not_published(monkeypatch):
+    published = []
+    monkeypatch.setattr(catalog_cache, '_listeners', [(published.append, related.compute)])
+
+    def loader():
+        # Una escritura durante la carga descarta la instantánea
+        catalog_cache.invalidate()
+        return _catalog(5)
+
+    catalog_cache.invalidate()
+    catalog_cache.get_snapshot(loader)
+    catalog_cache.invalidate()
+
+    assert published == []
@@ -0,0 +1,93 @@
+"""
+Agregados de rating al crear y borrar reseñas.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from postgrest.exceptions import APIError
+
+from repository import store_repo
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = None
+
+    def insert(self, row):
+        self.action = ('insert', row)
+        return self
+
+    def delete(self):
+        self.action = ('delete', None)
+        return self
+
+    def eq(self, column, value):
+        self.filter = (column, value)
+        return self
+
+    def execute(self):
+        kind, row = self.action
+        if kind == 'insert':
+            self.client.reviews.append(dict(row, id=len(self.client.reviews) + 1))
+            return SimpleNamespace(data=[self.client.reviews[-1]])
+        column, value = self.filter
+        deleted = [r for r in self.client.reviews if r[column] == value]
+        self.client.reviews = [r for r in self.client.reviews if r[column] != value]
+        return SimpleNamespace(data=deleted)
+
+
+class FakeClient:
+    def __init__(self, rpc_error=None):
+        self.reviews = [{'id': 1, 'product_id': 4, 'rating': 5}]
+        self.rpc_calls = []
+        self.rpc_error = rpc_error
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        def execute():
+            if self.rpc_error:
+                raise APIError(self.rpc_error)
+            self.rpc_calls.append(params)
+            return SimpleNamespace(data=True)
+        return SimpleNamespace(execute=execute)
+
+
+@pytest.fixture
+def recalculated(monkeypatch):
+    calls = []
+    monkeypatch.setattr(store_repo, 'updateProductRating', calls.append)
+    return calls
+
+
+def test_deleting_a_review_twice_decrements_once(monkeypatch, recalculated):
+    client = FakeClient()
+    monkeypatch.setattr(store_repo, 'get_client', lambda: client)
+
+    store_repo.deleteProductReview(1)
+    store_repo.deleteProductReview(1)
+
+    assert client.rpc_calls == [{'p_product_id': 4, 'p_rating_delta': -5, 'p_count_delta': -1}]
+
+
+def test_missing_rating_function_falls_back_to_recalculation(monkeypatch, recalculated):
+    client = FakeClient(rpc_error={'code': 'PGRST202', 'message': 'Could not find the function'})
+    monkeypatch.setattr(store_repo, 'get_client', lambda: client)
+
+    result = store_repo.createProductReview({'product_id': 4, 'name': 'Ana', 'rating': 3, 'comment': 'Rico'})
+
+    assert result['status'] == 'ok'
+    assert recalculated == [4]
+
+
+def test_other_rpc_errors_are_raised(monkeypatch, recalculated):
+    client = FakeClient(rpc_error={'code': '57014', 'message': 'canceling statement'})
+    monkeypatch.setattr(store_repo, 'get_client', lambda: client)
+
+    with pytest.raises(APIError):
+        store_repo.deleteProductReview(1)
+    assert recalculated == []
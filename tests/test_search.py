@@ -0,0 +1,24 @@
+"""
+GET /api/products/search: parámetros de la URL tal y como llegan al repositorio.
+"""
+
+import pytest
+
+from repository import store_repo
+
+
+@pytest.fixture
+def client():
+    from main import create_app
+    return create_app().test_client()
+
+
+def test_empty_filters_mean_no_filter(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(store_repo, 'searchProducts', lambda **kwargs: calls.append(kwargs) or [])
+
+    response = client.get('/api/products/search?q=kenia&category=&roast=')
+
+    assert response.status_code == 200
+    assert calls[0]['category'] is None
+    assert calls[0]['roast'] is None
@@ -0,0 +1,133 @@
+"""
+El camino de SQL directo (db.pg_pool + repository.sql_queries) debe
+devolver lo mismo que el de PostgREST. Los dos se ejecutan contra el mismo
+PostgreSQL local: PostgREST con el sustituto de tests/postgrest_stub.py.
+"""
+
+import pytest
+
+from postgrest_stub import PostgrestStub
+
+
+@pytest.fixture
+def repo(pg_url, monkeypatch):
+    """store_repo con el cliente de PostgREST apuntando al PostgreSQL de prueba"""
+    import psycopg2
+
+    from db import pg_pool
+    from repository import store_repo
+
+    conn = psycopg2.connect(pg_url)
+    conn.autocommit = True
+    stub = PostgrestStub(conn)
+    monkeypatch.setattr(store_repo, 'get_client', lambda: stub)
+
+    monkeypatch.setattr(pg_pool, 'SUPABASE_DB_URL', pg_url)
+    monkeypatch.setattr(pg_pool, 'PG_SSLMODE', 'disable')
+    monkeypatch.setattr(pg_pool, '_pool', None)
+
+    yield store_repo
+
+    if pg_pool._pool is not None:
+        pg_pool._pool.closeall()
+        pg_pool._pool = None
+    conn.close()
+
+
+def _both(repo, monkeypatch, fn, *args, **kwargs):
+    """Resultado de fn por PostgREST y por SQL directo"""
+    from db import pg_pool
+
+    monkeypatch.setattr(pg_pool, 'USE_DIRECT_SQL', False)
+    via_postgrest = fn(*args, **kwargs)
+    monkeypatch.setattr(pg_pool, 'USE_DIRECT_SQL', True)
+    via_sql = fn(*args, **kwargs)
+    return via_postgrest, via_sql
+
+
+def _normalize(value):
+    """Los números de PostgREST y los de jsonb pueden diferir en el tipo (int/float)"""
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(float(value), 6)
+    return value
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'category': 'coffee'},
+    {'roast': 'medio', 'limit': 3},
+    {'min_price': 20, 'max_price': 35},
+    {'featured': True},
+    {'is_new': False, 'category': 'coffee'},
+    {'category': 'accesorios', 'min_price': 0},
+    {'category': 'té'},
+])
+def test_search_products_matches_postgrest(repo, monkeypatch, filters):
+    via_postgrest, via_sql = _both(repo, monkeypatch, repo.searchProducts, **filters)
+    assert _normalize(via_sql) == _normalize(via_postgrest)
+
+
+def test_search_products_excludes_inactive_and_orders_newest_first(repo, monkeypatch):
+    _, via_sql = _both(repo, monkeypatch, repo.searchProducts)
+    ids = [product['id'] for product in via_sql]
+    assert 7 not in ids
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_get_all_orders_matches_postgrest(repo, monkeypatch):
+    via_postgrest, via_sql = _both(repo, monkeypatch, repo.getAllOrders)
+    assert len(via_sql) == 9
+    assert _normalize(via_sql) == _normalize(via_postgrest)
+
+
+@pytest.mark.parametrize('status_filter', ['all', 'pending', 'cancelled'])
+def test_order_pages_match_postgrest(repo, monkeypatch, status_filter):
+    def walk(limit=2):
+        pages, cursor = [], None
+        while True:
+            page = repo.obtainOrders(status_filter, limit=limit, cursor=cursor)
+            pages.append(page['data'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return pages
+
+    via_postgrest, via_sql = _both(repo, monkeypatch, walk)
+    assert _normalize(via_sql) == _normalize(via_postgrest)
+
+
+def test_revenue_by_day_matches_postgrest(repo, monkeypatch):
+    via_postgrest, via_sql = _both(repo, monkeypatch, repo.getRevenueByDay, days=30)
+    assert via_sql
+    assert _normalize(via_sql) == _normalize(via_postgrest)
+    assert sum(row['orders'] for row in via_sql) == 7  # 9 pedidos menos 2 cancelados
+
+
+def test_prepared_statements_are_reused(repo, monkeypatch):
+    from db import pg_pool
+
+    monkeypatch.setattr(pg_pool, 'USE_DIRECT_SQL', True)
+    monkeypatch.setattr(pg_pool, 'PG_POOL_MIN', 1)
+    monkeypatch.setattr(pg_pool, 'PG_POOL_MAX', 1)
+    repo.searchProducts(category='coffee')
+    repo.searchProducts(roast='claro')
+
+    with pg_pool.connection() as conn:
+        assert 'search_products_by_filters' in conn.prepared
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM pg_prepared_statements WHERE name = 'search_products_by_filters'")
+            assert cur.fetchone()[0] == 1
+
+
+@pytest.mark.parametrize('fields', [['id', 'status'], ['status', 'items'], ['total', 'profiles']])
+def test_order_fields_match_postgrest(repo, monkeypatch, fields):
+    via_postgrest, via_sql = _both(repo, monkeypatch, repo.getAllOrders, fields=fields)
+    assert {key for order in via_postgrest for key in order} == {'id', *fields}
+    assert _normalize(via_sql) == _normalize(via_postgrest)
+
+    page_postgrest, page_sql = _both(repo, monkeypatch, repo.getAllOrders, limit=3, fields=fields)
+    assert page_postgrest['next_cursor'] == page_sql['next_cursor']
+    assert _normalize(page_sql['data']) == _normalize(page_postgrest['data'])